@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the embedding kNN router against the classifier head
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from src.router.knn import VectorIndex
+
+def synthetic_vectors(rng, n, dim, centers):
+    """Clustered unit vectors, so nearest neighbors are meaningful as with real embeddings."""
+    return centers[rng.integers(0, len(centers), size=n)] + 0.035 * rng.standard_normal((n, dim), dtype=np.float32)
+
+def benchmark_search(num_vectors, dim, dtype, num_lists, probes, top_k, batch_size, repeats):
+    """Search latency and recall@k against exact search over a synthetic memory-mapped index."""
+    rng = np.random.default_rng(0)
+    centers = VectorIndex._normalize(rng.standard_normal((max(num_vectors // 100, 1), dim), dtype=np.float32))
+    with tempfile.TemporaryDirectory() as index_dir:
+        index = VectorIndex(index_dir, dim=dim, dtype=dtype)
+        for start in range(0, num_vectors, 100_000):
+            n = min(100_000, num_vectors - start)
+            index.add(synthetic_vectors(rng, n, dim, centers), rng.integers(0, 4, size=n))
+
+        if num_lists:
+            index.train_ivf(num_lists)
+        else:
+            probes = [0]
+
+        queries = synthetic_vectors(rng, batch_size, dim, centers)
+        _, exact = index.search(queries, top_k=top_k, num_probe=0)
+        print(f"search: {num_vectors} x {dim} {dtype}, lists={num_lists}, top_k={top_k}")
+        for num_probe in probes:
+            _, found = index.search(queries, top_k=top_k, num_probe=num_probe)
+            recall = np.mean([len(set(f) & set(e)) / top_k for f, e in zip(found, exact)])
+            for batch in (1, batch_size):
+                index.search(queries[:batch], top_k=top_k, num_probe=num_probe)  # warm up page cache
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    index.search(queries[:batch], top_k=top_k, num_probe=num_probe)
+                elapsed = (time.perf_counter() - start) / repeats
+                print(f"  probe={num_probe:<3} batch={batch:<4} {elapsed * 1000 / batch:.3f} ms/query, "
+                      f"recall@{top_k}={recall:.3f}")
+
+def benchmark_router(classifier_path, data_path, limit):
+    """End-to-end Router.predict latency and accuracy: classifier head vs kNN."""
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+    from config import get_config
+    from src.data.partitioned import PartitionedParquetStore
+    from src.router.inference import Router
+    from src.router.knn import KNNRouterModel
+
+    router = Router()
+    classifier = AutoModelForSequenceClassification.from_pretrained(classifier_path)
+    router.register_model("classifier", classifier, AutoTokenizer.from_pretrained(classifier_path))
+    knn_model, knn_tokenizer = KNNRouterModel.from_config(get_config("router_config"))
+    router.register_model("knn", knn_model, knn_tokenizer)
+
+    # The split is stored label by label, so take a stratified sample rather than its first rows
+    df = PartitionedParquetStore(data_path).sample(
+        total=limit, strategy="stratified", columns=["chunk", "label"], seed=0
+    ).to_pandas()
+    for name in ("classifier", "knn"):
+        correct = 0
+        start = time.perf_counter()
+        for text, label in zip(df["chunk"], df["label"]):
+            correct += int(router.predict(name, text) == label)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {elapsed * 1000 / len(df):.2f} ms/query, accuracy={correct / len(df):.4f} on {len(df)} queries")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kNN routing")
+    parser.add_argument("--num-vectors", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--dtype", default="int8", choices=VectorIndex.DTYPES)
+    parser.add_argument("--num-lists", type=int, default=4096)
+    parser.add_argument("--num-probe", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--classifier", default=None,
+                       help="Trained classifier directory; enables the end-to-end comparison")
+    parser.add_argument("--data", default="data/test/router/test_dataset.parquet")
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    benchmark_search(args.num_vectors, args.dim, args.dtype, args.num_lists,
+                     args.num_probe, args.top_k, args.batch_size, args.repeats)
+    if args.classifier:
+        benchmark_router(args.classifier, args.data, args.limit)
+
+if __name__ == "__main__":
+    main()
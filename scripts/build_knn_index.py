@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Build or extend the embedding kNN router index
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import get_config
+from src.data.partitioned import PartitionedParquetStore
+from src.router.knn import KNNRouterModel
+
+def main():
+    parser = argparse.ArgumentParser(description="Embed labeled chunks into the kNN router index")
+    parser.add_argument("--data", default="data/training/router/training_dataset.parquet",
+                       help="Parquet split (file or label-partitioned directory) with 'chunk' and 'label' columns")
+    parser.add_argument("--label", type=int, default=None,
+                       help="Override the label of every row (e.g. when adding a new expert)")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    config = get_config("router_config")
+    knn_config = config.get("KNN")
+    model, tokenizer = KNNRouterModel.from_config(config)
+    model.eval()
+
+    df = PartitionedParquetStore(args.data).to_pandas(columns=["chunk", "label"])
+    labels = [args.label] * len(df) if args.label is not None else df["label"].tolist()
+    model.add_examples(
+        df["chunk"].tolist(),
+        labels,
+        tokenizer,
+        batch_size=args.batch_size,
+        max_length=knn_config.get("MaxLength", 512)
+    )
+
+    num_lists = knn_config.get("NumLists", 0)
+    if num_lists and not model.index.num_lists:
+        if len(model.index) >= num_lists:
+            model.index.train_ivf(num_lists)
+        else:
+            print(f"Only {len(model.index)} vectors, fewer than NumLists={num_lists}; keeping exact search")
+
+    print(f"kNN index at {knn_config.get('IndexDir')} holds {len(model.index)} vectors")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Report layers executed, latency and accuracy of early-exit routing
+"""
+
+import os
+import json
+import time
+import argparse
+import sys
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import get_config
+from src.data.partitioned import PartitionedParquetStore
+from src.router.early_exit import EarlyExitClassifier
+
+def load_model(model_dir, model_config):
+    """Load the trained router (full model or LoRA adapter) saved with its exit heads."""
+    if os.path.exists(os.path.join(model_dir, "adapter_config.json")):
+        from peft import PeftModel
+        model = AutoModelForSequenceClassification.from_pretrained(
+            model_config.get("BASE_MODEL"), num_labels=model_config.get("NumLabels", 4)
+        )
+        model = PeftModel.from_pretrained(model, model_dir)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    return model.eval()
+
+def evaluate(model, tokenizer, texts, labels, batch_size, max_length):
+    """Accuracy, mean layers executed and latency per query over batched inference."""
+    correct, layers, elapsed = 0, 0, 0.0
+    for start in range(0, len(texts), batch_size):
+        inputs = tokenizer(texts[start:start + batch_size], return_tensors="pt",
+                           truncation=True, padding=True, max_length=max_length)
+        begin = time.perf_counter()
+        with torch.no_grad():
+            outputs = model(**inputs)
+        elapsed += time.perf_counter() - begin
+
+        predictions = outputs.logits.argmax(dim=-1)
+        correct += int((predictions == torch.tensor(labels[start:start + batch_size])).sum())
+        if hasattr(outputs, "exit_layers"):
+            layers += int(outputs.exit_layers.sum())
+        else:
+            layers += len(predictions) * model.config.num_hidden_layers
+    return {
+        "accuracy": correct / len(texts),
+        "avg_layers": layers / len(texts),
+        "ms_per_query": elapsed * 1000 / len(texts)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate early-exit routing on the test split")
+    parser.add_argument("--model", required=True, help="Directory saved by TrainingPipeline.run(early_exit=True)")
+    parser.add_argument("--data", default="data/test/router/test_dataset.parquet")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.05, 0.1, 0.2, 0.3, 0.5])
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--output", default=None, help="Optional path for a JSON report")
+    args = parser.parse_args()
+
+    config = get_config("router_config")
+    model = load_model(args.model, config.get("model"))
+    tokenizer = AutoTokenizer.from_pretrained(config.get("Dataset").get("Tokenizer").get("TokenizerName"))
+    df = PartitionedParquetStore(args.data).to_pandas(columns=["chunk", "label"])
+    texts, labels = df["chunk"].tolist(), df["label"].tolist()
+
+    report = {"queries": len(texts), "batch_size": args.batch_size, "results": []}
+    full = evaluate(model, tokenizer, texts, labels, args.batch_size, args.max_length)
+    report["results"].append({"threshold": None, **full})
+    for threshold in args.thresholds:
+        early_exit = EarlyExitClassifier.from_pretrained(model, args.model, entropy_threshold=threshold).eval()
+        result = evaluate(early_exit, tokenizer, texts, labels, args.batch_size, args.max_length)
+        report["results"].append({"threshold": threshold, **result})
+
+    print(f"{'threshold':>10} {'accuracy':>9} {'layers':>7} {'ms/query':>9} {'speedup':>8}")
+    for result in report["results"]:
+        name = "full" if result["threshold"] is None else f"{result['threshold']:.2f}"
+        speedup = full["ms_per_query"] / result["ms_per_query"]
+        print(f"{name:>10} {result['accuracy']:>9.4f} {result['avg_layers']:>7.2f} "
+              f"{result['ms_per_query']:>9.2f} {speedup:>7.2f}x")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
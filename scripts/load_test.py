@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Replay router queries against the routing/expert path under open-loop load
+"""
+
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import get_config
+from src.pipeline.load_test import (
+    HTTPTarget, LoadGenerator, RoutedExpertTarget, RouterTarget, load_queries, write_report
+)
+
+def build_target(args, timeout):
+    """HTTP endpoint, or an in-process Router (optionally followed by the experts)."""
+    if args.url:
+        return HTTPTarget(args.url, field=args.field, timeout=timeout)
+
+    from src.router.inference import Router
+    router = Router()
+    if args.classifier:
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+        model = AutoModelForSequenceClassification.from_pretrained(args.classifier)
+        router.register_model(args.router_name, model, AutoTokenizer.from_pretrained(args.classifier))
+    else:
+        from src.router.knn import KNNRouterModel
+        model, tokenizer = KNNRouterModel.from_config(get_config("router_config"))
+        router.register_model(args.router_name, model, tokenizer)
+
+    if not args.experts:
+        return RouterTarget(router, args.router_name)
+
+    from src.experts.engine import ExpertEngine
+    label_to_expert = {}
+    for item in args.expert_map:
+        label, expert = item.split("=", 1)
+        label_to_expert[int(label)] = expert
+    engine = ExpertEngine.from_config()
+    engine.max_batch_size = args.max_batch_size
+    return RoutedExpertTarget(router, args.router_name, engine, label_to_expert,
+                              max_new_tokens=args.max_new_tokens, timeout=timeout)
+
+def main():
+    pipeline_config = get_config("pipeline_config").get("pipeline", {})
+
+    parser = argparse.ArgumentParser(description="Open-loop load test for routing and experts")
+    parser.add_argument("--data", default="data/test/router/test_dataset.parquet",
+                       help="Router Parquet split, or a captured query log (.jsonl/.log/.txt)")
+    parser.add_argument("--column", default="chunk")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--url", default=None, help="Local HTTP endpoint; in-process Router when omitted")
+    parser.add_argument("--field", default="query", help="JSON field carrying the query for --url")
+    parser.add_argument("--classifier", default=None, help="Trained classifier directory (default: kNN backend)")
+    parser.add_argument("--router-name", default="router")
+    parser.add_argument("--experts", action="store_true", help="Also generate with the routed expert")
+    parser.add_argument("--expert-map", nargs="*", default=[], help="label=expert_name pairs")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=pipeline_config.get("max_batch_size", 16),
+                       help="Expert engine batch size to test")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 5, 10, 20, 50])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[pipeline_config.get("max_batch_size", 16)])
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per (rate, concurrency) run")
+    parser.add_argument("--arrival", default="poisson", choices=["poisson", "constant"])
+    parser.add_argument("--seed", type=int, default=0, help="Seeds query shuffling and Poisson arrivals")
+    parser.add_argument("--timeout", type=float, default=pipeline_config.get("timeout", 30))
+    parser.add_argument("--output", default=f"reports/load_test_{datetime.now():%Y%m%d_%H%M%S}.json")
+    args = parser.parse_args()
+
+    queries = load_queries(args.data, column=args.column, limit=args.limit, seed=args.seed)
+    generator = LoadGenerator(build_target(args, args.timeout), queries, timeout=args.timeout, seed=args.seed)
+    results = generator.sweep(args.rates, args.concurrency, duration=args.duration, arrival=args.arrival)
+
+    print(f"{'conc':>5} {'rate':>7} {'tput/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>6} {'tmo':>6}")
+    for r in results:
+        print(f"{r['concurrency']:>5} {r['rate']:>7.1f} {r['throughput']:>8.2f} {r['p50_ms']:>8.1f} "
+              f"{r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['error_rate']:>6.1%} {r['timeout_rate']:>6.1%}")
+    for concurrency, rate in LoadGenerator.find_saturation(results).items():
+        print(f"concurrency {concurrency}: sustains up to {rate} req/s" if rate else
+              f"concurrency {concurrency}: saturated at every tested rate")
+
+    metadata = {key: value for key, value in vars(args).items() if key != "output"}
+    metadata["queries"] = len(queries)
+    write_report(args.output, results, metadata)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+import os
+import glob
+import shutil
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from datasets import Dataset
+
+from src.utils.logging import setup_logger
+
+logger = setup_logger(
+    name=__name__,
+    log_file="logs/pipeline.log",
+    level=logging.INFO
+)
+
+
+class PartitionedParquetStore:
+    """
+    Label-partitioned Parquet layout: one `label=<value>/part-00000.parquet`
+    file per label under `path`, written with zstd compression, tuned row
+    groups and column statistics. Per-label counts come from the file footers
+    and samples are drawn by reading only the row groups they need.
+
+    A plain single-file Parquet path is also accepted for reading.
+    """
+    def __init__(self, path: str, label_column: str = "label"):
+        self.path = path
+        self.label_column = label_column
+
+    # --- Writing ---
+    def write(self, data, row_group_size: int = 10_000, compression: str = "zstd") -> str:
+        """Write a HuggingFace Dataset, DataFrame or Arrow table partitioned by label."""
+        table = self._to_table(data)
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+        for value in pc.unique(table[self.label_column]).to_pylist():
+            partition = table.filter(pc.equal(table[self.label_column], value))
+            partition_dir = os.path.join(self.path, f"{self.label_column}={value}")
+            os.makedirs(partition_dir, exist_ok=True)
+            pq.write_table(
+                partition,
+                os.path.join(partition_dir, "part-00000.parquet"),
+                row_group_size=row_group_size,
+                compression=compression,
+                write_statistics=True
+            )
+        logger.info(f"Wrote {table.num_rows} rows partitioned by '{self.label_column}' to {self.path}")
+        return self.path
+
+    @staticmethod
+    def _to_table(data) -> pa.Table:
+        if isinstance(data, pa.Table):
+            return data
+        if isinstance(data, Dataset):
+            # flatten_indices applies any pending shuffle/select to the Arrow data
+            return data.flatten_indices().data.table
+        return pa.Table.from_pandas(data, preserve_index=False)
+
+    # --- Reading ---
+    def file_list(self) -> List[str]:
+        """All Parquet files of the dataset, e.g. for `load_dataset("parquet", data_files=...)`."""
+        if os.path.isfile(self.path):
+            return [self.path]
+        return sorted(glob.glob(os.path.join(self.path, "**", "*.parquet"), recursive=True))
+
+    def to_pandas(self, columns: Optional[List[str]] = None):
+        """
+        Read the whole dataset into a DataFrame, file by file. Reading the
+        directory in one go would also parse the `label=<value>` directories
+        as a partition key that clashes with the stored label column.
+        """
+        import pandas as pd
+        return pd.concat([pd.read_parquet(file, columns=columns) for file in self.file_list()], ignore_index=True)
+
+    def _row_groups(self) -> Dict[object, List[tuple]]:
+        """(file, row group index, row count) of every row group, grouped by label."""
+        groups: Dict[object, List[tuple]] = {}
+        for file in self.file_list():
+            metadata = pq.ParquetFile(file).metadata
+            label_idx = metadata.schema.to_arrow_schema().get_field_index(self.label_column)
+            for rg in range(metadata.num_row_groups):
+                row_group = metadata.row_group(rg)
+                stats = row_group.column(label_idx).statistics if label_idx >= 0 else None
+                if stats is not None and stats.has_min_max and stats.min == stats.max:
+                    groups.setdefault(stats.min, []).append((file, rg, row_group.num_rows))
+                else:
+                    # Mixed-label row group (flat file): split it by reading the label column
+                    labels = pq.ParquetFile(file).read_row_group(rg, columns=[self.label_column])
+                    counts = pc.value_counts(labels[self.label_column]).to_pylist()
+                    for item in counts:
+                        groups.setdefault(item["values"], []).append((file, rg, item["counts"]))
+        return groups
+
+    def get_label_counts(self) -> Dict[object, int]:
+        """Rows per label, read from Parquet footers only when partitioned."""
+        counts = {label: sum(n for _, _, n in groups) for label, groups in self._row_groups().items()}
+        logger.info(f"Label counts: {counts}")
+        return counts
+
+    def sample(
+        self,
+        n_per_label: Optional[int] = None,
+        total: Optional[int] = None,
+        strategy: str = "balanced",
+        columns: Optional[List[str]] = None,
+        seed: Optional[int] = None
+    ) -> Dataset:
+        """
+        Draw a class-balanced or stratified sample.
+
+        balanced   : `n_per_label` rows of every label (default: the smallest label count).
+        stratified : `total` rows split across labels in proportion to their counts.
+
+        For each label, randomly chosen row groups are read until they hold
+        enough rows, then rows are drawn uniformly from those groups. This is a
+        uniform sample of the label only if its file was written in random order
+        (the pipeline shuffles every per-class file and split before writing);
+        otherwise the rows come from a few contiguous stretches of the file.
+        """
+        rng = np.random.default_rng(seed)
+        groups = self._row_groups()
+        counts = {label: sum(n for _, _, n in g) for label, g in groups.items()}
+        if not counts:
+            return Dataset.from_dict({})
+
+        if strategy == "balanced":
+            per_label = n_per_label or min(counts.values())
+            wanted = {label: min(per_label, count) for label, count in counts.items()}
+        elif strategy == "stratified":
+            if total is None:
+                raise ValueError("Stratified sampling needs `total`.")
+            grand_total = sum(counts.values())
+            exact = {label: total * count / grand_total for label, count in counts.items()}
+            wanted = {label: int(share) for label, share in exact.items()}
+            # Hand leftover rows to the largest remainders
+            for label in sorted(exact, key=lambda l: exact[l] - wanted[l], reverse=True)[:total - sum(wanted.values())]:
+                wanted[label] += 1
+            wanted = {label: min(n, counts[label]) for label, n in wanted.items()}
+        else:
+            raise ValueError(f"Unknown sampling strategy '{strategy}'.")
+
+        if columns is not None and self.label_column not in columns:
+            columns = list(columns) + [self.label_column]
+
+        tables = []
+        for label, n in wanted.items():
+            if n == 0:
+                continue
+            picked, rows = [], 0
+            for i in rng.permutation(len(groups[label])):
+                picked.append(groups[label][i])
+                rows += groups[label][i][2]
+                if rows >= n:
+                    break
+            table = pa.concat_tables([
+                pq.ParquetFile(file).read_row_group(rg, columns=columns)
+                for file, rg, _ in picked
+            ])
+            table = table.filter(pc.equal(table[self.label_column], label))
+            tables.append(table.take(np.sort(rng.choice(table.num_rows, size=n, replace=False))))
+
+        sample = pa.concat_tables(tables)
+        logger.info(f"Sampled {sample.num_rows} rows ({strategy}) from {self.path}")
+        return Dataset(sample)
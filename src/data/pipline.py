@@ -4,6 +4,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List
 from datasets import Dataset, concatenate_datasets, load_dataset
 from src.data.processing import SQLiteDatasetLoader
+from src.data.partitioned import PartitionedParquetStore
 from config import all_configs, get_config
 from src.utils.logging import setup_logger
 
@@ -25,6 +26,9 @@ class ConcurrentDataPipeline:
             self.config = get_config("router_config").get('DataProcessing')
             self.output_dir = self.config.get("OutputDir")
         os.makedirs(self.output_dir, exist_ok=True)
+        parquet_config = get_config("router_config").get('DataProcessing').get("Parquet", {})
+        self.row_group_size = parquet_config.get("RowGroupSize", 10_000)
+        self.compression = parquet_config.get("Compression", "zstd")
         self.max_workers = max_workers
         self.parquet_files: List[str] = []
 
@@ -44,12 +48,22 @@ class ConcurrentDataPipeline:
 
         dataset = loader.load_all_encoded_dataset()
         loader.close()
+        # Rows come back in table order; shuffle so row groups are random slices for sampling
+        dataset = dataset.shuffle()
 
         output_path = os.path.join(self.output_dir, f"{config.get('Name')}.parquet")
-        dataset.to_parquet(output_path)
+        self._write_parquet(dataset, output_path)
         logger.info(f"Finished processing '{config.get('Name')}', saved to: {output_path}")
         return output_path
 
+    def _write_parquet(self, dataset: Dataset, path: str) -> str:
+        """Write a dataset as label-partitioned Parquet with the configured layout."""
+        return PartitionedParquetStore(path).write(
+            dataset,
+            row_group_size=self.row_group_size,
+            compression=self.compression
+        )
+
     def run_pipeline(self) -> Dataset:
         """Run concurrent processing and merge all datasets."""
         logger.info("🚀 Starting concurrent data pipeline...")
@@ -74,7 +88,10 @@ class ConcurrentDataPipeline:
             return Dataset.from_dict({})
 
         logger.info("Loading and combining parquet datasets...")
-        datasets = [load_dataset("parquet", data_files=f, split="train") for f in self.parquet_files]
+        datasets = [
+            load_dataset("parquet", data_files=PartitionedParquetStore(f).file_list(), split="train")
+            for f in self.parquet_files
+        ]
         combined = concatenate_datasets(datasets)
         combined = combined.shuffle()
 
@@ -92,7 +109,7 @@ class ConcurrentDataPipeline:
             save_path = os.path.join(BasePath, split_name, "router")
             os.makedirs(save_path, exist_ok=True)
             split_path = os.path.join(save_path, f"{split_name}_dataset.parquet")
-            dataset.to_parquet(split_path)
+            self._write_parquet(dataset, split_path)
             logger.info(f"{split_name.capitalize()} dataset saved at: {split_path}")
 
         logger.info("Concurrent data pipeline completed successfully.")
@@ -46,6 +46,9 @@ class SQLiteDatasetLoader:
         self.use_chunks = config.get("UseChunks")
         self.Shuffle = config.get("Shuffle")
         self.Name = config.get("Name")
+        self.min_text_length = config.get("MinTextLength")
+        self.rows_read = 0
+        self._filter_count = 0
 
         self.conn = sqlite3.connect(self.db_path)
         self.label_encoder = LabelEncoder()
@@ -63,38 +66,96 @@ class SQLiteDatasetLoader:
         logger.info(f"Category counts: {counts}")
         return counts
 
+    def _table_columns(self) -> List[str]:
+        """Return the column names of the configured table."""
+        cursor = self.conn.execute(f"PRAGMA table_info({self.table_name})")
+        return [row[1] for row in cursor.fetchall()]
+
+    def _mode_columns(self, use_chunks: bool) -> List[str]:
+        """Columns needed by the chunk or full-text processing mode."""
+        if use_chunks and self.chunk_column:
+            return [self.label_column, self.title_column, self.chunk_column]
+        return [self.label_column, self.title_column, self.text_column]
+
+    def _prepare_category_filter(self, allowed_categories: List[str]) -> str:
+        """
+        Load allowed categories into a temp table of their own and return its
+        name, so concurrent `iter_rows` generators never share a filter. The
+        rowid-paged scan probes this table's primary key for every row, which
+        keeps the query text small but reads the same rows an IN (...) list would.
+        """
+        self._filter_count += 1
+        temp_table = f"_allowed_categories_{self._filter_count}"
+        self.conn.execute(f"CREATE TEMP TABLE {temp_table} (value TEXT PRIMARY KEY)")
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO temp.{temp_table} (value) VALUES (?)",
+            [(category,) for category in allowed_categories]
+        )
+        return f"temp.{temp_table}"
+
     def iter_rows(
         self,
         allowed_categories: Optional[List[str]] = None,
-        max_batch: Optional[int] = None
+        max_batch: Optional[int] = None,
+        columns: Optional[List[str]] = None,
+        min_text_length: Optional[int] = None
     ) -> Generator[pd.DataFrame, None, None]:
-        """Yield batches of rows from SQLite table."""
-        offset = 0
+        """
+        Yield batches of rows from SQLite table.
+
+        Only `columns` are selected (all columns when None), categories are
+        filtered through a join on a per-call temp table, and rows whose text
+        column is shorter than `min_text_length` characters are dropped in SQL.
+        Batches are paged by rowid so later batches don't rescan skipped rows.
+        """
         batch_count = 0
+        last_rowid = None
         if allowed_categories == None:
             allowed_categories = self.AllowedCategories
+        if min_text_length == None:
+            min_text_length = self.min_text_length
 
-        while True:
-            query = f"SELECT * FROM {self.table_name} "
-            params: List[Any] = []
+        select_cols = ", ".join(f"t.{col}" for col in columns) if columns else "t.*"
+        base_query = f"SELECT t.rowid AS _rowid, {select_cols} FROM {self.table_name} AS t "
 
-            if allowed_categories:
-                placeholders = ",".join(["?"] * len(allowed_categories))
-                query += f"WHERE {self.label_column} IN ({placeholders}) "
-                params = allowed_categories
+        category_table = None
+        if allowed_categories:
+            category_table = self._prepare_category_filter(allowed_categories)
+            base_query += f"JOIN {category_table} AS c ON t.{self.label_column} = c.value "
 
-            query += f"LIMIT {self.batch_size} OFFSET {offset}"
-            df = pd.read_sql(query, self.conn, params=params)
+        conditions: List[str] = []
+        base_params: List[Any] = []
+        if min_text_length:
+            conditions.append(f"length(t.{self.text_column}) >= ?")
+            base_params.append(min_text_length)
 
-            if df.empty:
-                break
-
-            yield df
-            offset += self.batch_size
-            batch_count += 1
-
-            if max_batch and batch_count >= max_batch:
-                break
+        try:
+            while True:
+                where = list(conditions)
+                params = list(base_params)
+                if last_rowid is not None:
+                    where.append("t.rowid > ?")
+                    params.append(last_rowid)
+
+                query = base_query
+                if where:
+                    query += "WHERE " + " AND ".join(where) + " "
+                query += f"ORDER BY t.rowid LIMIT {self.batch_size}"
+                df = pd.read_sql(query, self.conn, params=params)
+
+                if df.empty:
+                    break
+
+                last_rowid = int(df["_rowid"].iloc[-1])
+                self.rows_read += len(df)
+                yield df.drop(columns=["_rowid"])
+                batch_count += 1
+
+                if max_batch and batch_count >= max_batch:
+                    break
+        finally:
+            if category_table:
+                self.conn.execute(f"DROP TABLE IF EXISTS {category_table}")
 
 
     def _explode_chunks(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -144,14 +205,27 @@ class SQLiteDatasetLoader:
     ) -> Dataset:
         """Load all data as HuggingFace Dataset, optionally with chunking and label override."""
         full_df = pd.DataFrame()
+        self.rows_read = 0
         if allowed_categories == None:
             allowed_categories = self.AllowedCategories
         
         if label == None:
             label = self.label
 
-        for batch_df in tqdm(self.iter_rows(allowed_categories=allowed_categories, max_batch=max_batch)):
-            if use_chunks and self.chunk_column:
+        chunk_mode = bool(use_chunks and self.chunk_column)
+        min_text_length = self.min_text_length
+        if not chunk_mode and not self.chunk_repeat_title and self.min_chunk_words:
+            # A text of n words has at least 2n - 1 characters, so shorter texts can never yield a chunk
+            min_text_length = max(min_text_length or 0, 2 * self.min_chunk_words - 1)
+
+        rows = self.iter_rows(
+            allowed_categories=allowed_categories,
+            max_batch=max_batch,
+            columns=self._mode_columns(chunk_mode),
+            min_text_length=min_text_length
+        )
+        for batch_df in tqdm(rows):
+            if chunk_mode:
                 batch_df = self._explode_chunks(batch_df)
             else:
                 batch_df = self._chunk_full_text(batch_df)
@@ -163,7 +237,7 @@ class SQLiteDatasetLoader:
 
         full_df["label"] = label_list
         dataset = Dataset.from_pandas(full_df[[self.label_column, self.title_column, "chunk", "label"]])
-        logger.info(f"Loaded dataset with {len(full_df)} samples.")
+        logger.info(f"Loaded dataset with {len(full_df)} samples from {self.rows_read} rows.")
         return dataset
 
     def export_jsonl(
@@ -173,8 +247,20 @@ class SQLiteDatasetLoader:
         max_batch: Optional[int] = None
     ):
         """Export dataset to JSONL format."""
+        columns = [self.title_column, self.text_column]
+        if "sections" in self._table_columns():
+            columns.append("sections")
+
+        self.rows_read = 0
+        # MinTextLength only applies to training data; export every row as before
+        rows = self.iter_rows(
+            allowed_categories=allowed_categories,
+            max_batch=max_batch,
+            columns=columns,
+            min_text_length=0
+        )
         with open(output_path, "w", encoding="utf-8") as f_out:
-            for batch_df in self.iter_rows(allowed_categories=allowed_categories, max_batch=max_batch):
+            for batch_df in rows:
                 for _, row in batch_df.iterrows():
                     title = row[self.title_column]
                     text = row[self.text_column]
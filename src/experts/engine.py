@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import deque
+from typing import Dict, List, Optional, Tuple, Union
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from config import get_config
+from src.experts.lora import AdapterContext, inject_multi_lora, load_peft_adapter
+from src.utils.logging import setup_logger
+
+logger = setup_logger(
+    name=__name__,
+    log_file="logs/experts.log",
+    level=logging.INFO
+)
+
+
+class GenerationRequest:
+    """
+    A single generation request for one expert (or the bare base model).
+    """
+    def __init__(self, request_id: int, input_ids: List[int], slot: int, max_new_tokens: int, temperature: float):
+        self.request_id = request_id
+        self.input_ids = input_ids
+        self.slot = slot
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.output_ids: List[int] = []
+        self.finished = False
+        self.text: Optional[str] = None
+
+    @property
+    def tokens(self) -> List[int]:
+        return self.input_ids + self.output_ids
+
+
+class ExpertEngine:
+    """
+    Runs all LoRA experts on one shared base model. Requests for different
+    adapters are batched into the same forward pass (each row applies its own
+    LoRA delta) and scheduled with continuous batching: finished rows leave
+    the batch after every decoding step and waiting requests take their place.
+
+    The active rows share one left-padded KV cache. Admitted requests are
+    prefilled together and merged into it, every step then feeds a single
+    token per row, and finished rows are dropped from the cache.
+    """
+    def __init__(
+        self,
+        model,
+        tokenizer=None,
+        max_batch_size: int = 16,
+        eos_token_id: Optional[int] = None,
+        pad_token_id: Optional[int] = None
+    ):
+        self.model = model.eval()
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        if eos_token_id is None and tokenizer is not None:
+            eos_token_id = tokenizer.eos_token_id
+        self.eos_token_id = eos_token_id
+        if pad_token_id is None:
+            # Padded positions are masked out, so any valid token id will do
+            pad_token_id = getattr(tokenizer, "pad_token_id", None) or 0
+        self.pad_token_id = pad_token_id
+        self.device = next(model.parameters()).device
+        config = model.config
+        self.max_positions = getattr(config, "n_positions", None) or getattr(config, "max_position_embeddings", None)
+
+        self.context = AdapterContext()
+        self.adapter_slots: Dict[str, int] = {}
+        self.waiting = deque()
+        self.active: List[GenerationRequest] = []
+        self._cache: Optional[List[Tuple[torch.Tensor, torch.Tensor]]] = None
+        self._attention_mask: Optional[torch.Tensor] = None
+        self._next_request_id = 0
+
+    @classmethod
+    def from_config(cls, expert_config: Optional[Dict] = None, pipeline_config: Optional[Dict] = None):
+        """Load the base model and every active expert from expert_config."""
+        if expert_config is None:
+            expert_config = get_config("expert_config")
+        if pipeline_config is None:
+            pipeline_config = get_config("pipeline_config")
+
+        base_path = expert_config.get("base_model").get("path")
+        tokenizer = AutoTokenizer.from_pretrained(base_path)
+        model = AutoModelForCausalLM.from_pretrained(base_path)
+        engine = cls(
+            model,
+            tokenizer,
+            max_batch_size=pipeline_config.get("pipeline", {}).get("max_batch_size", 16)
+        )
+
+        for expert in expert_config.get("experts", {}).values():
+            if expert.get("active"):
+                engine.load_adapter(expert.get("name"), expert.get("lora_weights_path"))
+        return engine
+
+    # --- Adapters ---
+    def add_adapter(self, name: str, layers: Dict[str, Tuple[torch.Tensor, torch.Tensor]], scaling: float):
+        """
+        Register LoRA weights {module_name: (A, B)} under `name`.
+        Module names are relative to the base model.
+        """
+        slot = self.adapter_slots.setdefault(name, len(self.adapter_slots) + 1)
+        wrapped = inject_multi_lora(self.model, list(layers), self.context)
+        for module_name, (lora_A, lora_B) in layers.items():
+            wrapped[module_name].set_adapter(slot, lora_A.to(self.device), lora_B.to(self.device), scaling)
+        logger.info(f"Registered adapter '{name}' in slot {slot} on {len(layers)} layers.")
+
+    def load_adapter(self, name: str, path: str):
+        """Register a LoRA adapter saved by peft under `name`."""
+        layers, scaling = load_peft_adapter(path)
+        self.add_adapter(name, layers, scaling)
+
+    # --- Scheduling ---
+    def create_request(
+        self,
+        prompt: Union[str, List[int]],
+        expert: Optional[str] = None,
+        max_new_tokens: int = 32,
+        temperature: float = 0.0
+    ) -> GenerationRequest:
+        """
+        Validate and tokenize a prompt for `expert` without queueing it;
+        `submit` queues it right away. Raises ValueError for an unknown expert
+        or a request that would run past the model's position limit.
+        """
+        if expert is not None and expert not in self.adapter_slots:
+            raise ValueError(f"Expert '{expert}' not registered.")
+        if isinstance(prompt, str):
+            input_ids = self.tokenizer(prompt)["input_ids"]
+        else:
+            input_ids = list(prompt)
+        if self.max_positions is not None and len(input_ids) + max_new_tokens > self.max_positions:
+            raise ValueError(
+                f"Prompt of {len(input_ids)} tokens plus {max_new_tokens} new tokens exceeds "
+                f"the model's {self.max_positions} positions."
+            )
+
+        request = GenerationRequest(
+            request_id=self._next_request_id,
+            input_ids=input_ids,
+            slot=self.adapter_slots.get(expert, 0),
+            max_new_tokens=max_new_tokens,
+            temperature=temperature
+        )
+        self._next_request_id += 1
+        return request
+
+    def submit(
+        self,
+        prompt: Union[str, List[int]],
+        expert: Optional[str] = None,
+        max_new_tokens: int = 32,
+        temperature: float = 0.0
+    ) -> GenerationRequest:
+        """
+        Queue a prompt (text or token ids) for `expert`; None runs the base model.
+        """
+        request = self.create_request(prompt, expert, max_new_tokens, temperature)
+        self.waiting.append(request)
+        return request
+
+    def _batch_inputs(self, requests: List[GenerationRequest]) -> Dict[str, torch.Tensor]:
+        """Left-pad the active sequences so the last column is every row's next position."""
+        max_len = max(len(r.tokens) for r in requests)
+        input_ids = torch.full((len(requests), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(requests), max_len), dtype=torch.long)
+        for row, request in enumerate(requests):
+            tokens = request.tokens
+            input_ids[row, max_len - len(tokens):] = torch.tensor(tokens, dtype=torch.long)
+            attention_mask[row, max_len - len(tokens):] = 1
+        position_ids = (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+        return {
+            "input_ids": input_ids.to(self.device),
+            "attention_mask": attention_mask.to(self.device),
+            "position_ids": position_ids.to(self.device)
+        }
+
+    def _next_tokens(self, logits: torch.Tensor, requests: List[GenerationRequest]) -> List[int]:
+        tokens = logits.argmax(dim=-1)
+        for row, request in enumerate(requests):
+            if request.temperature > 0:
+                probs = torch.softmax(logits[row] / request.temperature, dim=-1)
+                tokens[row] = torch.multinomial(probs, num_samples=1)[0]
+        return tokens.tolist()
+
+    def _forward(
+        self,
+        requests: List[GenerationRequest],
+        inputs: Dict[str, torch.Tensor],
+        past: Optional[List[Tuple[torch.Tensor, torch.Tensor]]] = None
+    ) -> Tuple[torch.Tensor, List[Tuple[torch.Tensor, torch.Tensor]]]:
+        """One forward pass with each row's adapter; returns last-position logits and the cache."""
+        self.context.adapter_ids = torch.tensor([r.slot for r in requests], device=self.device)
+        try:
+            with torch.no_grad():
+                outputs = self.model(
+                    **inputs,
+                    past_key_values=_build_cache(past) if past is not None else None,
+                    use_cache=True
+                )
+        finally:
+            self.context.adapter_ids = None
+        return outputs.logits[:, -1, :], _cache_layers(outputs.past_key_values)
+
+    def _append_tokens(self, requests: List[GenerationRequest], logits: torch.Tensor) -> List[GenerationRequest]:
+        finished = []
+        for request, token in zip(requests, self._next_tokens(logits, requests)):
+            request.output_ids.append(token)
+            if token == self.eos_token_id or len(request.output_ids) >= request.max_new_tokens:
+                request.finished = True
+                if self.tokenizer is not None:
+                    request.text = self.tokenizer.decode(request.output_ids, skip_special_tokens=True)
+                finished.append(request)
+        return finished
+
+    def _decode(self) -> List[GenerationRequest]:
+        """Feed every active row its last token on top of the shared cache."""
+        rows = len(self.active)
+        attention_mask = torch.cat(
+            [self._attention_mask, self._attention_mask.new_ones(rows, 1)], dim=1
+        )
+        inputs = {
+            "input_ids": torch.tensor([[r.tokens[-1]] for r in self.active], device=self.device),
+            "attention_mask": attention_mask,
+            "position_ids": torch.tensor([[len(r.tokens) - 1] for r in self.active], device=self.device)
+        }
+        logits, self._cache = self._forward(self.active, inputs, past=self._cache)
+        self._attention_mask = attention_mask
+        return self._append_tokens(self.active, logits)
+
+    def _prefill(self, requests: List[GenerationRequest]) -> List[GenerationRequest]:
+        """Encode admitted prompts in one pass and merge their cache into the active batch."""
+        inputs = self._batch_inputs(requests)
+        logits, cache = self._forward(requests, inputs)
+        attention_mask = inputs["attention_mask"]
+        if self.active:
+            # Left-pad the shorter side so both caches end at the same column
+            width = max(self._attention_mask.shape[1], attention_mask.shape[1])
+            cache = [
+                (torch.cat([_pad_left(k, width), _pad_left(new_k, width)]),
+                 torch.cat([_pad_left(v, width), _pad_left(new_v, width)]))
+                for (k, v), (new_k, new_v) in zip(self._cache, cache)
+            ]
+            attention_mask = torch.cat([_pad_left(self._attention_mask, width), _pad_left(attention_mask, width)])
+        self.active.extend(requests)
+        self._cache, self._attention_mask = cache, attention_mask
+        return self._append_tokens(requests, logits)
+
+    def _evict(self):
+        """Drop finished rows from the batch and the cache, and trim all-padding columns."""
+        keep = [row for row, request in enumerate(self.active) if not request.finished]
+        if len(keep) == len(self.active):
+            return
+        self.active = [self.active[row] for row in keep]
+        if not keep:
+            self._cache = self._attention_mask = None
+            return
+
+        index = torch.tensor(keep, device=self.device)
+        attention_mask = self._attention_mask[index]
+        start = int(attention_mask.any(dim=0).nonzero()[0])
+        self._attention_mask = attention_mask[:, start:]
+        self._cache = [(k[index, :, start:], v[index, :, start:]) for k, v in self._cache]
+
+    def step(self) -> List[GenerationRequest]:
+        """
+        Decode one token for every active row in a single forward pass, then
+        admit waiting requests into the freed rows (their prefill yields their
+        first token). Returns the requests that finished.
+        """
+        self._evict()  # rows cancelled since the last step
+        finished = []
+        if self.active:
+            finished.extend(self._decode())
+            self._evict()
+
+        admitted = []
+        while self.waiting and len(self.active) + len(admitted) < self.max_batch_size:
+            admitted.append(self.waiting.popleft())
+        if admitted:
+            finished.extend(self._prefill(admitted))
+            self._evict()
+        return finished
+
+    def cancel(self, request: GenerationRequest):
+        """Stop generating for `request`; an active row leaves the batch at the next step."""
+        if request in self.waiting:
+            self.waiting.remove(request)
+        request.finished = True
+
+    def reset(self):
+        """Drop every waiting and active request, e.g. after a failed step."""
+        for request in list(self.waiting) + self.active:
+            request.finished = True
+        self.waiting.clear()
+        self.active = []
+        self._cache = self._attention_mask = None
+
+    def run(self) -> List[GenerationRequest]:
+        """Step until every queued request has finished."""
+        finished = []
+        while self.waiting or self.active:
+            finished.extend(self.step())
+        return finished
+
+    def generate(
+        self,
+        prompts: List[Union[str, List[int]]],
+        experts: Optional[List[Optional[str]]] = None,
+        max_new_tokens: int = 32
+    ) -> List[GenerationRequest]:
+        """Generate for a list of prompts, one expert per prompt, in submission order."""
+        if experts is None:
+            experts = [None] * len(prompts)
+        requests = [self.submit(p, expert=e, max_new_tokens=max_new_tokens) for p, e in zip(prompts, experts)]
+        self.run()
+        return requests
+
+
+def _pad_left(tensor: torch.Tensor, width: int) -> torch.Tensor:
+    """Zero-pad the sequence axis (dim 1 of a mask, dim 2 of keys/values) on the left to `width`."""
+    axis = 1 if tensor.dim() == 2 else 2
+    missing = width - tensor.shape[axis]
+    if missing == 0:
+        return tensor
+    padding = [0, 0] * (tensor.dim() - 1 - axis) + [missing, 0]
+    return torch.nn.functional.pad(tensor, padding)
+
+
+def _cache_layers(past) -> List[Tuple[torch.Tensor, torch.Tensor]]:
+    """(key, value) per layer, each (batch, heads, seq, head_dim), from any transformers cache format."""
+    if hasattr(past, "layers"):
+        return [(layer.keys, layer.values) for layer in past.layers]
+    if hasattr(past, "key_cache"):
+        return list(zip(past.key_cache, past.value_cache))
+    return [(layer[0], layer[1]) for layer in past]
+
+
+def _build_cache(layers: List[Tuple[torch.Tensor, torch.Tensor]]):
+    """Wrap per-layer (key, value) pairs in the cache type the installed transformers expects."""
+    try:
+        from transformers import DynamicCache
+    except ImportError:
+        return tuple(layers)
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
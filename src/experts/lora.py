@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from torch import nn
+
+
+class AdapterContext:
+    """
+    Per-forward state shared by every MultiLoRALinear of one model:
+    the adapter slot of each row in the current batch (0 = base model only).
+    """
+    def __init__(self):
+        self.adapter_ids: Optional[torch.Tensor] = None
+
+
+class MultiLoRALinear(nn.Module):
+    """
+    Wraps a linear layer of the shared base model and adds a per-row LoRA delta,
+    so rows routed to different experts go through one forward pass.
+
+    LoRA weights of all adapters are stacked side by side (ranks zero-padded to
+    the largest one), so the whole batch takes one matmul pair:
+    delta = ((x @ A^T) * mask) @ (scale * B)^T, where the mask keeps the rank
+    columns of each row's own slot and drops every column for slot-0 rows.
+    """
+    def __init__(self, base_layer: nn.Module, context: AdapterContext):
+        super().__init__()
+        self.base_layer = base_layer
+        self.context = context
+        weight = base_layer.weight
+        if isinstance(base_layer, nn.Linear):
+            self.in_features, self.out_features = base_layer.in_features, base_layer.out_features
+        else:
+            # transformers' Conv1D stores its weight as (in_features, out_features)
+            self.in_features, self.out_features = weight.shape
+        self.adapters: Dict[int, Tuple[torch.Tensor, torch.Tensor, float]] = {}
+        # (slots * r, in), (out, slots * r) and the slot of each rank column; slot 0 has no columns
+        self.register_buffer("lora_A", weight.new_zeros(0, self.in_features), persistent=False)
+        self.register_buffer("lora_B", weight.new_zeros(self.out_features, 0), persistent=False)
+        self.register_buffer("column_slot", torch.zeros(0, dtype=torch.long, device=weight.device), persistent=False)
+
+    @property
+    def weight(self) -> torch.Tensor:
+        return self.base_layer.weight
+
+    def set_adapter(self, slot: int, lora_A: torch.Tensor, lora_B: torch.Tensor, scaling: float):
+        """Store adapter weights (A: r x in, B: out x r) in `slot` and restack."""
+        self.adapters[slot] = (lora_A, lora_B, scaling)
+        self._restack()
+
+    def _restack(self):
+        num_slots = max(self.adapters) + 1
+        rank = max(a.shape[0] for a, _, _ in self.adapters.values())
+        weight = self.base_layer.weight
+        lora_A = weight.new_zeros(num_slots - 1, rank, self.in_features)
+        lora_B = weight.new_zeros(self.out_features, num_slots - 1, rank)
+        for slot, (a, b, scale) in self.adapters.items():
+            lora_A[slot - 1, :a.shape[0]] = a.to(lora_A)
+            lora_B[:, slot - 1, :b.shape[1]] = scale * b.to(lora_B)
+        self.lora_A = lora_A.reshape(-1, self.in_features)
+        self.lora_B = lora_B.reshape(self.out_features, -1)
+        self.column_slot = torch.arange(1, num_slots, device=weight.device).repeat_interleave(rank)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        output = self.base_layer(x)
+        adapter_ids = self.context.adapter_ids
+        if adapter_ids is None or not self.adapters or not adapter_ids.any():
+            return output
+
+        # Slots this layer holds no weights for match no column and add nothing
+        mask = (adapter_ids[:, None] == self.column_slot).to(self.lora_A.dtype)
+        hidden = x.reshape(x.shape[0], -1, x.shape[-1]).to(self.lora_A.dtype) @ self.lora_A.T
+        delta = (hidden * mask[:, None, :]) @ self.lora_B.T
+        return output + delta.reshape(output.shape).to(output.dtype)
+
+
+def inject_multi_lora(model: nn.Module, module_names: List[str], context: AdapterContext) -> Dict[str, MultiLoRALinear]:
+    """
+    Wrap the named layers of `model` in MultiLoRALinear modules sharing
+    `context`. Layers that are already wrapped are reused. Returns the
+    wrappers by module name.
+    """
+    wrapped = {}
+    for name in module_names:
+        module = model.get_submodule(name)
+        if not isinstance(module, MultiLoRALinear):
+            parent_name, _, child_name = name.rpartition(".")
+            parent = model.get_submodule(parent_name) if parent_name else model
+            module = MultiLoRALinear(module, context)
+            setattr(parent, child_name, module)
+        wrapped[name] = module
+    return wrapped
+
+
+def load_peft_adapter(path: str) -> Tuple[Dict[str, Tuple[torch.Tensor, torch.Tensor]], float]:
+    """
+    Read a LoRA adapter saved by peft's `save_pretrained`.
+    Returns ({module_name: (A, B)}, scaling) with module names relative to the base model.
+    """
+    with open(os.path.join(path, "adapter_config.json"), "r", encoding="utf-8") as f:
+        adapter_config = json.load(f)
+
+    safetensors_path = os.path.join(path, "adapter_model.safetensors")
+    if os.path.exists(safetensors_path):
+        from safetensors.torch import load_file
+        state_dict = load_file(safetensors_path)
+    else:
+        state_dict = torch.load(os.path.join(path, "adapter_model.bin"), map_location="cpu")
+
+    weights: Dict[str, Dict[str, torch.Tensor]] = {}
+    for key, tensor in state_dict.items():
+        for part in ("lora_A", "lora_B"):
+            marker = f".{part}."
+            if marker in key:
+                module_name = key.split(marker)[0]
+                module_name = module_name.replace("base_model.model.", "", 1)
+                weights.setdefault(module_name, {})[part] = tensor
+
+    layers = {name: (parts["lora_A"], parts["lora_B"]) for name, parts in weights.items()}
+    scaling = adapter_config.get("lora_alpha", 1) / adapter_config.get("r", 1)
+    return layers, scaling
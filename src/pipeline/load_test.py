@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import socket
+import logging
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from src.data.partitioned import PartitionedParquetStore
+from src.utils.logging import setup_logger
+
+logger = setup_logger(
+    name=__name__,
+    log_file="logs/load_test.log",
+    level=logging.INFO
+)
+
+
+def load_queries(path: str, column: str = "chunk", limit: Optional[int] = None, seed: int = 0) -> List[str]:
+    """
+    Read replay queries from a router Parquet split (file or partitioned
+    directory) or from a captured query log. Log lines are either JSON objects
+    with a "query", "text" or "input" field, or plain text. Splits are stored
+    label by label, so their queries are shuffled with `seed` before `limit`
+    applies; logs keep their captured order.
+    """
+    if path.endswith((".jsonl", ".log", ".txt")):
+        queries = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = line
+                if isinstance(record, dict):
+                    record = record.get("query") or record.get("text") or record.get("input")
+                if record:
+                    queries.append(str(record))
+    else:
+        import pyarrow.parquet as pq
+        queries = []
+        for file in PartitionedParquetStore(path).file_list():
+            queries.extend(pq.read_table(file, columns=[column])[column].to_pylist())
+        queries = [queries[i] for i in np.random.default_rng(seed).permutation(len(queries))]
+    return queries[:limit] if limit else queries
+
+
+class RouterTarget:
+    """In-process target: classify each query with a model registered on a Router."""
+    def __init__(self, router, name: str):
+        self.router = router
+        self.name = name
+
+    def __call__(self, query: str):
+        return self.router.predict(self.name, query)
+
+
+class RoutedExpertTarget:
+    """
+    In-process target for the full path: route each query, then generate with
+    the predicted expert on an ExpertEngine. A background thread owns the
+    engine and steps it, so concurrent queries share its continuous batches;
+    callers only hand requests and cancellations over under a short lock,
+    never while a step runs. A failed step fails every query in the engine
+    with its exception, and a query still pending after `timeout` seconds is
+    cancelled and raises TimeoutError.
+    """
+    def __init__(
+        self,
+        router,
+        name: str,
+        engine,
+        label_to_expert: Dict[int, str],
+        max_new_tokens: int = 32,
+        timeout: float = 30.0
+    ):
+        self.router = router
+        self.name = name
+        self.engine = engine
+        self.label_to_expert = label_to_expert
+        self.max_new_tokens = max_new_tokens
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)
+        self._submitted: List[Any] = []
+        self._cancelled: List[Any] = []
+        self._done: Dict[int, threading.Event] = {}
+        self._errors: Dict[int, Exception] = {}
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def _loop(self):
+        while True:
+            with self._work:
+                while not (self._submitted or self._cancelled or self.engine.waiting or self.engine.active):
+                    self._work.wait()
+                self.engine.waiting.extend(self._submitted)
+                self._submitted.clear()
+                for request in self._cancelled:
+                    self.engine.cancel(request)
+                self._cancelled.clear()
+            if not (self.engine.waiting or self.engine.active):
+                continue
+
+            try:
+                finished = self.engine.step()
+            except Exception as e:
+                with self._work:
+                    # Requests submitted during the step are not in the engine yet
+                    queued = {request.request_id for request in self._submitted}
+                    failed = [request_id for request_id in self._done if request_id not in queued]
+                    logger.warning(f"Expert engine step failed, failing {len(failed)} pending requests: {e}")
+                    self.engine.reset()
+                    for request_id in failed:
+                        self._errors[request_id] = e
+                        self._done.pop(request_id).set()
+                continue
+            with self._work:
+                for request in finished:
+                    done = self._done.pop(request.request_id, None)
+                    if done is not None:
+                        done.set()
+
+    def __call__(self, query: str):
+        label = self.router.predict(self.name, query)
+        expert = self.label_to_expert.get(label)
+        with self._work:
+            # Raises here, for this query only, if the expert or its length is invalid
+            request = self.engine.create_request(query, expert=expert, max_new_tokens=self.max_new_tokens)
+            done = self._done[request.request_id] = threading.Event()
+            self._submitted.append(request)
+            self._work.notify()
+        if not done.wait(self.timeout):
+            with self._work:
+                self._done.pop(request.request_id, None)
+                self._errors.pop(request.request_id, None)
+                if request in self._submitted:
+                    self._submitted.remove(request)
+                else:
+                    self._cancelled.append(request)
+                    self._work.notify()
+            raise TimeoutError(f"No expert output within {self.timeout}s.")
+        error = self._errors.pop(request.request_id, None)
+        if error is not None:
+            raise error
+        return request.text if request.text is not None else request.output_ids
+
+
+class HTTPTarget:
+    """Local HTTP target: POST {"<field>": query} as JSON to `url`."""
+    def __init__(self, url: str, field: str = "query", timeout: float = 30.0):
+        self.url = url
+        self.field = field
+        self.timeout = timeout
+
+    def __call__(self, query: str):
+        body = json.dumps({self.field: query}, ensure_ascii=False).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, socket.timeout):
+                raise TimeoutError(str(e)) from e
+            raise
+
+
+class LoadGenerator:
+    """
+    Open-loop load generator: requests are issued on a fixed arrival schedule
+    (Poisson or constant rate) whether or not earlier ones have finished, and
+    at most `concurrency` are in flight. Latency is measured from the scheduled
+    arrival time, so time spent queueing for a free worker is included.
+    """
+    def __init__(self, target: Callable[[str], Any], queries: List[str], timeout: float = 30.0, seed: int = 0):
+        if not queries:
+            raise ValueError("No queries to replay.")
+        self.target = target
+        self.queries = queries
+        self.timeout = timeout
+        self.seed = seed
+
+    def _call(self, query: str, scheduled: float) -> Dict[str, Any]:
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            self.target(query)
+        except (TimeoutError, socket.timeout):
+            status = "timeout"
+        except Exception as e:
+            status = "error"
+            logger.warning(f"Request failed: {e}")
+        finished = time.perf_counter()
+        if status == "ok" and finished - scheduled > self.timeout:
+            status = "timeout"
+        return {"scheduled": scheduled, "started": started, "finished": finished, "status": status}
+
+    def run(
+        self,
+        rate: float,
+        concurrency: int,
+        duration: Optional[float] = None,
+        num_requests: Optional[int] = None,
+        arrival: str = "poisson"
+    ) -> Dict[str, Any]:
+        """Replay queries at `rate` requests/s for `duration` s (or `num_requests`) and summarize."""
+        if num_requests is None:
+            num_requests = max(1, int(rate * (duration or 10.0)))
+        rng = np.random.default_rng(self.seed)
+        if arrival == "poisson":
+            offsets = np.cumsum(rng.exponential(1.0 / rate, size=num_requests))
+        elif arrival == "constant":
+            offsets = np.arange(num_requests) / rate
+        else:
+            raise ValueError(f"Unknown arrival process '{arrival}'.")
+
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            start = time.perf_counter()
+            for i, offset in enumerate(offsets):
+                scheduled = start + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(executor.submit(self._call, self.queries[i % len(self.queries)], scheduled))
+        records = [future.result() for future in futures]
+
+        summary = self.summarize(records, start)
+        summary.update({
+            "rate": rate,
+            "offered_rate": num_requests / offsets[-1] if offsets[-1] > 0 else float(rate),
+            "concurrency": concurrency,
+            "arrival": arrival
+        })
+        logger.info(
+            f"rate={rate} concurrency={concurrency}: throughput={summary['throughput']:.2f}/s "
+            f"p99={summary['p99_ms']:.1f}ms errors={summary['error_rate']:.2%} timeouts={summary['timeout_rate']:.2%}"
+        )
+        return summary
+
+    @staticmethod
+    def summarize(records: List[Dict[str, Any]], start: float) -> Dict[str, Any]:
+        total = len(records)
+        ok = [r for r in records if r["status"] == "ok"]
+        latencies = np.array([r["finished"] - r["scheduled"] for r in ok]) * 1000
+        service = np.array([r["finished"] - r["started"] for r in records]) * 1000
+        elapsed = max(r["finished"] for r in records) - start
+
+        def percentile(q):
+            return float(np.percentile(latencies, q)) if len(latencies) else float("nan")
+
+        return {
+            "requests": total,
+            "completed": len(ok),
+            "duration_s": elapsed,
+            "throughput": len(ok) / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "mean_service_ms": float(service.mean()),
+            "error_rate": sum(r["status"] == "error" for r in records) / total,
+            "timeout_rate": sum(r["status"] == "timeout" for r in records) / total
+        }
+
+    def sweep(
+        self,
+        rates: List[float],
+        concurrencies: List[int],
+        duration: float = 10.0,
+        arrival: str = "poisson"
+    ) -> List[Dict[str, Any]]:
+        """Run every (concurrency, rate) combination, rates in increasing order."""
+        results = []
+        for concurrency in concurrencies:
+            for rate in sorted(rates):
+                results.append(self.run(rate, concurrency, duration=duration, arrival=arrival))
+        return results
+
+    @staticmethod
+    def find_saturation(
+        results: List[Dict[str, Any]],
+        min_throughput_ratio: float = 0.9,
+        max_failure_rate: float = 0.01
+    ) -> Dict[int, Optional[float]]:
+        """
+        Saturation point per concurrency level: the highest rate, walking up
+        from the lowest, before throughput stops keeping up with the rate
+        actually offered or errors plus timeouts exceed `max_failure_rate`.
+        """
+        saturation: Dict[int, Optional[float]] = {}
+        saturated = set()
+        for result in sorted(results, key=lambda r: (r["concurrency"], r["rate"])):
+            concurrency = result["concurrency"]
+            saturation.setdefault(concurrency, None)
+            if concurrency in saturated:
+                continue
+            sustained = (
+                result["throughput"] >= min_throughput_ratio * result["offered_rate"]
+                and result["error_rate"] + result["timeout_rate"] <= max_failure_rate
+            )
+            if sustained:
+                saturation[concurrency] = result["rate"]
+            else:
+                saturated.add(concurrency)
+        return saturation
+
+
+def write_report(path: str, results: List[Dict[str, Any]], metadata: Dict[str, Any]) -> str:
+    """Write a JSON report holding the run settings, every result and the saturation points."""
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "metadata": metadata,
+        "saturation": {str(k): v for k, v in LoadGenerator.find_saturation(results).items()},
+        "results": results
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    logger.info(f"Load test report saved to {path}")
+    return path
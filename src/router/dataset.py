@@ -3,6 +3,7 @@
 from config import all_configs, get_config
 from datasets import load_dataset
 from transformers import AutoTokenizer
+from src.data.partitioned import PartitionedParquetStore
 
 
 class DatasetModule:
@@ -30,13 +31,13 @@ class DatasetModule:
             train_ds, valid_ds, test_ds
         """
         # Load the train split from the parquet file
-        train_ds = load_dataset("parquet", data_files=self.dataset_paths["Train"], split="train")
+        train_ds = load_dataset("parquet", data_files=PartitionedParquetStore(self.dataset_paths["Train"]).file_list(), split="train")
         
         # Load the validation split from the parquet file
-        valid_ds = load_dataset("parquet", data_files=self.dataset_paths["Validation"], split="train")
+        valid_ds = load_dataset("parquet", data_files=PartitionedParquetStore(self.dataset_paths["Validation"]).file_list(), split="train")
         
         # Load the test split from the parquet file
-        test_ds = load_dataset("parquet", data_files=self.dataset_paths["Test"], split="train")
+        test_ds = load_dataset("parquet", data_files=PartitionedParquetStore(self.dataset_paths["Test"]).file_list(), split="train")
 
         # Tokenize the train split
         train_ds = train_ds.map(
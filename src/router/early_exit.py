@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import math
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import torch
+from torch import nn
+from transformers.modeling_outputs import SequenceClassifierOutput
+
+
+class EarlyExitClassifier(nn.Module):
+    """
+    Wraps the router's sequence classifier (BERT-style encoder, optionally
+    LoRA-wrapped by peft) with lightweight classification heads on
+    intermediate layers.
+
+    Training (or any call with labels) runs the full model and trains the
+    heads on the [CLS] state of their layer together with the model's own
+    classifier; with `freeze_backbone` the encoder's base weights are frozen
+    while peft's LoRA adapters keep training. Inference
+    runs the encoder layer by layer and retires a row as soon as an exit head's
+    normalized prediction entropy falls below `entropy_threshold`; remaining
+    rows continue as a smaller batch. Rows that never exit use the model's own
+    classifier.
+    """
+    HEADS_FILE = "early_exit_heads.pt"
+    CONFIG_FILE = "early_exit_config.json"
+
+    def __init__(
+        self,
+        model,
+        exit_layers: List[int],
+        entropy_threshold: float = 0.2,
+        freeze_backbone: bool = True,
+        dropout: float = 0.1
+    ):
+        super().__init__()
+        self.model = model
+        self.num_layers = len(self.encoder_model.encoder.layer)
+        self.num_labels = self.backbone.config.num_labels
+        self.exit_layers = sorted(layer for layer in set(exit_layers) if 1 <= layer < self.num_layers)
+        self.entropy_threshold = entropy_threshold
+        self.freeze_backbone = freeze_backbone
+        self.dropout = dropout
+
+        hidden_size = self.backbone.config.hidden_size
+        self.heads = nn.ModuleDict({
+            str(layer): nn.Sequential(nn.Dropout(dropout), nn.Linear(hidden_size, self.num_labels))
+            for layer in self.exit_layers
+        })
+        if freeze_backbone:
+            # Only the base weights are frozen; peft's LoRA adapters keep fine-tuning the encoder
+            for name, param in self.model.named_parameters():
+                param.requires_grad = "lora_" in name
+            # A freshly built model's classifier is untrained, so it keeps learning.
+            # Under peft only the active modules_to_save copy runs, not original_module
+            classifier = self.backbone.classifier
+            if hasattr(classifier, "modules_to_save"):
+                classifier = classifier.modules_to_save[classifier.active_adapter]
+            for param in classifier.parameters():
+                param.requires_grad = True
+
+    # Views into `model`, not registered as submodules so its weights are
+    # held (and saved) only once
+    @property
+    def backbone(self):
+        return self.model.get_base_model() if hasattr(self.model, "get_base_model") else self.model
+
+    @property
+    def encoder_model(self):
+        return getattr(self.backbone, self.backbone.base_model_prefix)
+
+    @classmethod
+    def from_config(cls, model, config: Dict[str, Any]):
+        """Attach new exit heads configured in router_config's EarlyExit section."""
+        early_exit_config = config.get("EarlyExit", {})
+        return cls(
+            model,
+            exit_layers=early_exit_config.get("ExitLayers", [2, 4, 6, 8, 10]),
+            entropy_threshold=early_exit_config.get("EntropyThreshold", 0.2),
+            freeze_backbone=early_exit_config.get("FreezeBackbone", True)
+        )
+
+    @classmethod
+    def from_pretrained(cls, model, path: str, entropy_threshold: Optional[float] = None):
+        """Attach exit heads previously saved to `path` by `save_pretrained`."""
+        with open(os.path.join(path, cls.CONFIG_FILE), "r", encoding="utf-8") as f:
+            saved = json.load(f)
+        if entropy_threshold is None:
+            entropy_threshold = saved["entropy_threshold"]
+        classifier = cls(model, saved["exit_layers"], entropy_threshold, dropout=saved.get("dropout", 0.1))
+        classifier.heads.load_state_dict(torch.load(os.path.join(path, cls.HEADS_FILE), map_location="cpu"))
+        return classifier
+
+    def save_pretrained(self, path: str):
+        """Save the wrapped model as before plus the exit heads and their config."""
+        os.makedirs(path, exist_ok=True)
+        self.model.save_pretrained(path)
+        torch.save(self.heads.state_dict(), os.path.join(path, self.HEADS_FILE))
+        with open(os.path.join(path, self.CONFIG_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "exit_layers": self.exit_layers,
+                "entropy_threshold": self.entropy_threshold,
+                "dropout": self.dropout
+            }, f)
+
+    def normalized_entropy(self, logits: torch.Tensor) -> torch.Tensor:
+        """Prediction entropy scaled to [0, 1] by log(num_labels)."""
+        log_probs = torch.log_softmax(logits.float(), dim=-1)
+        entropy = -(log_probs.exp() * log_probs).sum(dim=-1)
+        return entropy / math.log(self.num_labels)
+
+    def forward(self, input_ids, attention_mask=None, token_type_ids=None, labels=None, **kwargs):
+        if self.training or labels is not None:
+            return self._forward_train(input_ids, attention_mask, token_type_ids, labels, **kwargs)
+        with torch.no_grad():
+            return self._forward_early_exit(input_ids, attention_mask, token_type_ids)
+
+    def _forward_train(self, input_ids, attention_mask, token_type_ids, labels, **kwargs):
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+            labels=labels,
+            output_hidden_states=True,
+            **kwargs
+        )
+        loss = None
+        if labels is not None:
+            # hidden_states[0] is the embedding output, hidden_states[i] follows layer i
+            losses = [
+                nn.functional.cross_entropy(self.heads[str(layer)](outputs.hidden_states[layer][:, 0]), labels)
+                for layer in self.exit_layers
+            ]
+            losses.append(outputs.loss)
+            loss = torch.stack(losses).mean()
+        return SequenceClassifierOutput(loss=loss, logits=outputs.logits)
+
+    def _final_logits(self, hidden: torch.Tensor) -> torch.Tensor:
+        pooler = getattr(self.encoder_model, "pooler", None)
+        if pooler is not None:
+            return self.backbone.classifier(self.backbone.dropout(pooler(hidden)))
+        return self.backbone.classifier(hidden)
+
+    def _forward_early_exit(self, input_ids, attention_mask, token_type_ids):
+        batch = input_ids.shape[0]
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+
+        hidden = self.encoder_model.embeddings(input_ids=input_ids, token_type_ids=token_type_ids)
+        mask = (1.0 - attention_mask[:, None, None, :].to(hidden.dtype)) * torch.finfo(hidden.dtype).min
+        logits = hidden.new_zeros(batch, self.num_labels)
+        exit_layers = torch.full((batch,), self.num_layers, dtype=torch.long, device=input_ids.device)
+        remaining = torch.arange(batch, device=input_ids.device)
+
+        for index, layer in enumerate(self.encoder_model.encoder.layer, start=1):
+            output = layer(hidden, attention_mask=mask)
+            hidden = output[0] if isinstance(output, tuple) else output
+            if str(index) not in self.heads:
+                continue
+
+            head_logits = self.heads[str(index)](hidden[:, 0])
+            done = self.normalized_entropy(head_logits) < self.entropy_threshold
+            if done.any():
+                logits[remaining[done]] = head_logits[done].to(logits.dtype)
+                exit_layers[remaining[done]] = index
+                keep = ~done
+                hidden, mask, remaining = hidden[keep], mask[keep], remaining[keep]
+                if len(remaining) == 0:
+                    break
+
+        if len(remaining):
+            logits[remaining] = self._final_logits(hidden).to(logits.dtype)
+        return SimpleNamespace(logits=logits, exit_layers=exit_layers)
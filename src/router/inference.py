@@ -29,3 +29,20 @@ class Router:
             outputs = model(**inputs)
             prediction = outputs.logits.argmax(dim=-1).item()
         return prediction
+
+    def predict_batch(self, name, texts):
+        """
+        Send a batch of texts to the chosen registered model.
+        """
+        if name not in self.models:
+            raise ValueError(f"Model '{name}' not registered.")
+
+        model = self.models[name]["model"]
+        tokenizer = self.models[name]["tokenizer"]
+
+        inputs = tokenizer(texts, return_tensors="pt", truncation=True, padding="max_length", max_length=512)
+        model.eval()
+        with torch.no_grad():
+            outputs = model(**inputs)
+            predictions = outputs.logits.argmax(dim=-1).tolist()
+        return predictions
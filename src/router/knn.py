@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from transformers import AutoModel, AutoTokenizer
+
+from src.utils.logging import setup_logger
+
+logger = setup_logger(
+    name=__name__,
+    log_file="logs/knn_router.log",
+    level=logging.INFO
+)
+
+
+class VectorIndex:
+    """
+    Append-only, memory-mapped store of L2-normalized embeddings and their labels.
+    Vectors are kept on disk as float16 or int8 (with a float32 scale per row)
+    and searched by batched inner product, optionally restricted to the nearest
+    IVF partitions.
+    """
+    DTYPES = ("float16", "int8")
+
+    def __init__(self, index_dir: str, dim: Optional[int] = None, dtype: str = "float16"):
+        self.index_dir = index_dir
+        self.meta_path = os.path.join(index_dir, "meta.json")
+
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            if dim is None:
+                raise ValueError(f"No index found at '{index_dir}' and no dim given to create one.")
+            if dtype not in self.DTYPES:
+                raise ValueError(f"Unsupported dtype '{dtype}', expected one of {self.DTYPES}.")
+            os.makedirs(index_dir, exist_ok=True)
+            self.meta = {"dim": dim, "dtype": dtype, "count": 0, "num_lists": 0, "num_labels": 0}
+            self._save_meta()
+
+        self.centroids = None
+        self._inverted = None
+        self._open()
+        if "num_labels" not in self.meta:
+            # Indexes written before labels were counted
+            self.meta["num_labels"] = int(np.max(self.labels)) + 1 if self.count else 0
+
+    # --- Storage helpers ---
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _save_meta(self):
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+
+    def _memmap(self, name: str, dtype, shape):
+        if self.count == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=shape)
+
+    def _open(self):
+        """(Re)open the memory-mapped files for the current row count."""
+        self.vectors = self._memmap("vectors.bin", self.meta["dtype"], (self.count, self.dim))
+        self.labels = self._memmap("labels.bin", np.int32, (self.count,))
+        self.scales = self._memmap("scales.bin", np.float32, (self.count,)) if self.is_int8 else None
+        self.lists = self._memmap("lists.bin", np.int32, (self.count,)) if self.num_lists else None
+        if self.num_lists and self.centroids is None:
+            self.centroids = np.load(self._path("centroids.npy"))
+        self._inverted = None
+
+    @property
+    def dim(self) -> int:
+        return self.meta["dim"]
+
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+
+    @property
+    def num_lists(self) -> int:
+        return self.meta["num_lists"]
+
+    @property
+    def num_labels(self) -> int:
+        """One more than the largest stored label."""
+        return self.meta["num_labels"]
+
+    @property
+    def is_int8(self) -> bool:
+        return self.meta["dtype"] == "int8"
+
+    def __len__(self) -> int:
+        return self.count
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def _decode(self, rows) -> np.ndarray:
+        """Return the selected rows (slice or index array) as float32."""
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.is_int8:
+            vectors *= self.scales[rows][:, None]
+        return vectors
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+
+    # --- Writing ---
+    def add(self, vectors: np.ndarray, labels) -> int:
+        """
+        Append embeddings with their labels. Returns the new row count.
+        Existing rows are never rewritten, so adding an expert is just an append.
+        """
+        vectors = self._normalize(vectors)
+        labels = np.asarray(labels, dtype=np.int32)
+        if vectors.ndim != 2 or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of shape (n, {self.dim}), got {vectors.shape}.")
+        if len(labels) != len(vectors):
+            raise ValueError("vectors and labels must have the same length.")
+
+        if self.is_int8:
+            scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+            stored = np.round(vectors / scales[:, None]).astype(np.int8)
+            with open(self._path("scales.bin"), "ab") as f:
+                f.write(scales.astype(np.float32).tobytes())
+        else:
+            stored = vectors.astype(np.float16)
+
+        with open(self._path("vectors.bin"), "ab") as f:
+            f.write(stored.tobytes())
+        with open(self._path("labels.bin"), "ab") as f:
+            f.write(labels.tobytes())
+        if self.num_lists:
+            with open(self._path("lists.bin"), "ab") as f:
+                f.write(self._assign(vectors).tobytes())
+
+        self.meta["count"] += len(vectors)
+        if len(labels):
+            self.meta["num_labels"] = max(self.num_labels, int(labels.max()) + 1)
+        self._save_meta()
+        self._open()
+        return self.count
+
+    def train_ivf(
+        self,
+        num_lists: int,
+        sample_size: int = 100_000,
+        iterations: int = 10,
+        chunk_size: int = 65_536,
+        seed: int = 0
+    ):
+        """
+        Partition the stored vectors into `num_lists` clusters with spherical
+        k-means on a sample, then assign every row to its nearest centroid.
+        Rows added later are assigned on append.
+        """
+        if self.count < num_lists:
+            raise ValueError(f"Need at least {num_lists} vectors to train {num_lists} lists, have {self.count}.")
+
+        rng = np.random.default_rng(seed)
+        sample_idx = np.sort(rng.choice(self.count, size=min(sample_size, self.count), replace=False))
+        sample = self._decode(sample_idx)
+        centroids = sample[rng.choice(len(sample), size=num_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            non_empty = np.bincount(assignment, minlength=num_lists) > 0
+            centroids[non_empty] = self._normalize(sums[non_empty])
+
+        self.centroids = centroids
+        np.save(self._path("centroids.npy"), centroids)
+        assignment = np.concatenate([
+            self._assign(self._decode(slice(start, start + chunk_size)))
+            for start in range(0, self.count, chunk_size)
+        ])
+
+        # Rewrite the rows grouped by list so every list is one contiguous
+        # block on disk. Row ids therefore change when the index is (re)trained.
+        order = np.argsort(assignment, kind="stable")
+        self._rewrite("lists.bin", assignment[order])
+        self._rewrite("labels.bin", np.asarray(self.labels)[order])
+        if self.is_int8:
+            self._rewrite("scales.bin", np.asarray(self.scales)[order])
+        with open(self._path("vectors.bin.tmp"), "wb") as f:
+            for start in range(0, self.count, chunk_size):
+                f.write(np.asarray(self.vectors[order[start:start + chunk_size]]).tobytes())
+        os.replace(self._path("vectors.bin.tmp"), self._path("vectors.bin"))
+
+        self.meta["num_lists"] = num_lists
+        self.meta["sorted_count"] = self.count
+        self._save_meta()
+        self._open()
+        logger.info(f"Trained IVF index with {num_lists} lists over {self.count} vectors.")
+
+    def _rewrite(self, name: str, array: np.ndarray):
+        """Atomically replace one of the index files with `array`."""
+        with open(self._path(name + ".tmp"), "wb") as f:
+            f.write(array.tobytes())
+        os.replace(self._path(name + ".tmp"), self._path(name))
+
+    # --- Search ---
+    @staticmethod
+    def _top_k(scores: np.ndarray, indices: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Keep the k best columns of each row, sorted by descending score."""
+        if scores.shape[1] > k:
+            part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, part, axis=1)
+            indices = np.take_along_axis(indices, part, axis=1)
+        order = np.argsort(-scores, axis=1)
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+    def _inverted_lists(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Offsets of each list's contiguous block among the rows sorted at
+        training time, plus row ids and offsets of rows appended since.
+        """
+        if self._inverted is None:
+            sorted_count = self.meta.get("sorted_count", 0)
+            lists = np.asarray(self.lists)
+            offsets = np.concatenate([[0], np.cumsum(np.bincount(lists[:sorted_count], minlength=self.num_lists))])
+            tail = lists[sorted_count:]
+            tail_order = np.argsort(tail, kind="stable") + sorted_count
+            tail_offsets = np.concatenate([[0], np.cumsum(np.bincount(tail, minlength=self.num_lists))])
+            self._inverted = (offsets, tail_order, tail_offsets)
+        return self._inverted
+
+    def search(
+        self,
+        queries: np.ndarray,
+        top_k: int = 10,
+        num_probe: int = 8,
+        chunk_size: int = 16_384
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batched nearest-neighbor search by cosine similarity.
+
+        Only the `num_probe` nearest IVF lists are scanned; 0 (or an untrained
+        index) scans every row. Returns (scores, indices), both of shape
+        (len(queries), top_k). Missing neighbors are reported with index -1 and
+        score -inf.
+        """
+        queries = self._normalize(np.atleast_2d(queries))
+        batch = len(queries)
+        best_scores = np.full((batch, top_k), -np.inf, dtype=np.float32)
+        best_idx = np.full((batch, top_k), -1, dtype=np.int64)
+        if self.count == 0:
+            return best_scores, best_idx
+
+        if self.num_lists and num_probe:
+            # Decode every probed list once and score it against all queries
+            # that probe it; candidates are merged per query at the end.
+            num_probe = min(num_probe, self.num_lists)
+            probes = np.argpartition(-(queries @ self.centroids.T), num_probe - 1, axis=1)[:, :num_probe]
+            probe_mask = np.zeros((batch, self.num_lists), dtype=bool)
+            np.put_along_axis(probe_mask, probes, True, axis=1)
+
+            offsets, tail_order, tail_offsets = self._inverted_lists()
+            candidates = [([best_scores[i]], [best_idx[i]]) for i in range(batch)]
+            for list_id in np.flatnonzero(probe_mask.any(axis=0)):
+                rows = np.arange(offsets[list_id], offsets[list_id + 1])
+                block = np.asarray(self.vectors[offsets[list_id]:offsets[list_id + 1]], dtype=np.float32)
+                tail = tail_order[tail_offsets[list_id]:tail_offsets[list_id + 1]]
+                if len(tail):
+                    rows = np.concatenate([rows, tail])
+                    block = np.concatenate([block, np.asarray(self.vectors[tail], dtype=np.float32)])
+                if len(rows) == 0:
+                    continue
+
+                query_idx = np.flatnonzero(probe_mask[:, list_id])
+                scores = queries[query_idx] @ block.T
+                if self.is_int8:
+                    scores *= self.scales[rows]
+                for j, i in enumerate(query_idx):
+                    candidates[i][0].append(scores[j])
+                    candidates[i][1].append(rows)
+
+            for i, (scores, indices) in enumerate(candidates):
+                best_scores[i:i + 1], best_idx[i:i + 1] = self._top_k(
+                    np.concatenate(scores)[None, :],
+                    np.concatenate(indices)[None, :],
+                    top_k
+                )
+            return best_scores, best_idx
+
+        for start in range(0, self.count, chunk_size):
+            block = slice(start, min(start + chunk_size, self.count))
+            scores = queries @ np.asarray(self.vectors[block], dtype=np.float32).T
+            if self.is_int8:
+                scores *= self.scales[block]
+            indices = np.broadcast_to(np.arange(block.start, block.stop), scores.shape)
+            best_scores, best_idx = self._top_k(
+                np.concatenate([best_scores, scores], axis=1),
+                np.concatenate([best_idx, indices], axis=1),
+                top_k
+            )
+        return best_scores, best_idx
+
+
+class KNNRouterModel:
+    """
+    Embedding kNN routing backend. Behaves like the sequence classifier for
+    `Router.register_model`: calling it with tokenized inputs returns an object
+    whose `logits` hold the summed neighbor similarity per label.
+    """
+    def __init__(
+        self,
+        encoder,
+        index: VectorIndex,
+        num_labels: int = 4,
+        top_k: int = 10,
+        num_probe: int = 8
+    ):
+        self.encoder = encoder
+        self.index = index
+        self.num_labels = num_labels
+        self.top_k = top_k
+        self.num_probe = num_probe
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]):
+        """
+        Build the backend and its tokenizer from router_config.
+        Returns (model, tokenizer), ready for `Router.register_model`.
+        """
+        knn_config = config.get("KNN")
+        encoder_name = knn_config.get("EncoderName")
+        tokenizer = AutoTokenizer.from_pretrained(encoder_name)
+        encoder = AutoModel.from_pretrained(encoder_name)
+        index = VectorIndex(
+            knn_config.get("IndexDir"),
+            dim=encoder.config.hidden_size,
+            dtype=knn_config.get("Dtype", "float16")
+        )
+        model = cls(
+            encoder,
+            index,
+            num_labels=config.get("model").get("NumLabels", 4),
+            top_k=knn_config.get("TopK", 10),
+            num_probe=knn_config.get("NumProbe", 8)
+        )
+        if len(index) == 0:
+            logger.warning(f"kNN index at '{index.index_dir}' is empty; add examples before routing with it.")
+        return model, tokenizer
+
+    def eval(self):
+        self.encoder.eval()
+        return self
+
+    def embed(self, input_ids, attention_mask=None, **kwargs) -> np.ndarray:
+        """Mean-pool the encoder's last hidden state into one vector per row."""
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        with torch.no_grad():
+            hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask, **kwargs).last_hidden_state
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1)
+        return pooled.float().cpu().numpy()
+
+    def vote(self, embeddings: np.ndarray) -> np.ndarray:
+        """Sum the similarities of the top-k neighbors per label."""
+        if len(self.index) == 0:
+            raise ValueError(f"kNN index at '{self.index.index_dir}' is empty; add examples before routing.")
+        scores, indices = self.index.search(embeddings, top_k=self.top_k, num_probe=self.num_probe)
+        # Experts appended after the classifier config was written add labels beyond num_labels
+        num_labels = max(self.num_labels, self.index.num_labels)
+        logits = np.zeros((len(embeddings), num_labels), dtype=np.float32)
+        found = indices >= 0
+        rows = np.broadcast_to(np.arange(len(embeddings))[:, None], indices.shape)
+        labels = np.asarray(self.index.labels[indices[found]])
+        np.add.at(logits, (rows[found], labels), scores[found])
+        return logits
+
+    def __call__(self, input_ids, attention_mask=None, **kwargs):
+        logits = self.vote(self.embed(input_ids, attention_mask=attention_mask, **kwargs))
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+    def add_examples(
+        self,
+        texts: List[str],
+        labels: List[int],
+        tokenizer,
+        batch_size: int = 32,
+        max_length: int = 512
+    ) -> int:
+        """Embed labeled example chunks and append them to the index."""
+        for start in range(0, len(texts), batch_size):
+            inputs = tokenizer(
+                texts[start:start + batch_size],
+                return_tensors="pt",
+                truncation=True,
+                padding=True,
+                max_length=max_length
+            )
+            self.index.add(self.embed(**inputs), labels[start:start + batch_size])
+        logger.info(f"Index now holds {len(self.index)} vectors.")
+        return len(self.index)
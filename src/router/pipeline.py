@@ -4,6 +4,7 @@ import os
 from config import get_config
 from src.router.model import ModelModule
 from src.router.trainer import TrainingModule
+from src.router.early_exit import EarlyExitClassifier
 from src.data.dataset import DatasetModule
 
 class TrainingPipeline:
@@ -19,11 +20,13 @@ class TrainingPipeline:
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
 
-    def run(self, load_existing_model=None):
+    def run(self, load_existing_model=None, early_exit=False):
         """
         Execute the training pipeline.
         Args:
             load_existing_model (str, optional): Path to previously trained model weights.
+            early_exit (bool): Train early-exit heads on intermediate layers
+                alongside the classifier (see the EarlyExit section of the config).
         """
 
         # 1. Load and tokenize datasets
@@ -34,6 +37,8 @@ class TrainingPipeline:
         # 2. Build or load model
         model_module = ModelModule(self.model_config)
         model = model_module.build_model(load_from=load_existing_model)
+        if early_exit:
+            model = EarlyExitClassifier.from_config(model, self.config)
         print(f"✅ Model ready: {model.__class__.__name__}")
 
         # 3. Train the model
@@ -51,4 +56,4 @@ class TrainingPipeline:
 # Example usage:
 if __name__ == "__main__":
     pipeline = TrainingPipeline()
-    pipeline.run()  # or pipeline.run(load_existing_model="./trained_model")
+    pipeline.run()  # or pipeline.run(load_existing_model="./trained_model", early_exit=True)
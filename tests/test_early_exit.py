@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import torch
+from peft import LoraConfig, TaskType, get_peft_model
+from safetensors.torch import save_file
+from transformers import BertConfig, BertForSequenceClassification
+
+from src.router.early_exit import EarlyExitClassifier
+
+
+def tiny_bert():
+    torch.manual_seed(0)
+    config = BertConfig(vocab_size=100, hidden_size=32, num_hidden_layers=4, num_attention_heads=4,
+                        intermediate_size=64, num_labels=3)
+    return BertForSequenceClassification(config).eval()
+
+
+def padded_batch():
+    torch.manual_seed(1)
+    input_ids = torch.randint(1, 100, (5, 12))
+    attention_mask = torch.ones_like(input_ids)
+    for row, length in enumerate((12, 7, 3, 10, 5)):
+        input_ids[row, length:] = 0
+        attention_mask[row, length:] = 0
+    return input_ids, attention_mask
+
+
+def test_no_exit_matches_base_model():
+    model = tiny_bert()
+    input_ids, attention_mask = padded_batch()
+    expected = model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+    # Entropy is never below 0, so every row runs all layers
+    classifier = EarlyExitClassifier(model, exit_layers=[1, 2, 3], entropy_threshold=0.0).eval()
+    outputs = classifier(input_ids=input_ids, attention_mask=attention_mask)
+    torch.testing.assert_close(outputs.logits, expected, rtol=1e-4, atol=1e-5)
+    assert (outputs.exit_layers == 4).all()
+
+
+def test_batched_exits_match_single_rows():
+    # Random heads are close to uniform; 0.93 lets rows leave at different layers
+    classifier = EarlyExitClassifier(tiny_bert(), exit_layers=[1, 2, 3], entropy_threshold=0.93).eval()
+    input_ids, attention_mask = padded_batch()
+    batched = classifier(input_ids=input_ids, attention_mask=attention_mask)
+    assert len(set(batched.exit_layers.tolist())) > 1
+    for row in range(len(input_ids)):
+        length = int(attention_mask[row].sum())
+        single = classifier(input_ids=input_ids[row:row + 1, :length])
+        torch.testing.assert_close(batched.logits[row:row + 1], single.logits, rtol=1e-4, atol=1e-5)
+        assert batched.exit_layers[row] == single.exit_layers[0]
+
+
+def test_training_keeps_classifier_trainable_and_checkpoints(tmp_path):
+    model = tiny_bert()
+    classifier = EarlyExitClassifier(model, exit_layers=[2], freeze_backbone=True).train()
+    trainable = {name for name, param in classifier.named_parameters() if param.requires_grad}
+    assert trainable == {
+        "model.classifier.weight", "model.classifier.bias", "heads.2.1.weight", "heads.2.1.bias"
+    }
+
+    input_ids, attention_mask = padded_batch()
+    loss = classifier(input_ids=input_ids, attention_mask=attention_mask, labels=torch.tensor([0, 1, 2, 0, 1])).loss
+    loss.backward()
+    assert model.classifier.weight.grad is not None
+
+    # Trainer saves a plain nn.Module's state dict with safetensors, which rejects shared tensors
+    state_dict = classifier.state_dict()
+    assert len(state_dict) == len(model.state_dict()) + len(classifier.heads.state_dict())
+    save_file(state_dict, str(tmp_path / "model.safetensors"))
+
+
+def test_training_keeps_lora_adapters_trainable(tmp_path):
+    model = get_peft_model(tiny_bert(), LoraConfig(task_type=TaskType.SEQ_CLS, r=4, lora_alpha=8,
+                                                   target_modules=["query", "value"]))
+    classifier = EarlyExitClassifier(model, exit_layers=[2], freeze_backbone=True).train()
+    trainable = {name for name, param in classifier.named_parameters() if param.requires_grad}
+    lora = {name for name in trainable if ".lora_" in name}
+    assert len(lora) == 4 * 2 * 2  # layers x (query, value) x (A, B)
+    assert trainable - lora == {
+        "model.base_model.model.classifier.modules_to_save.default.weight",
+        "model.base_model.model.classifier.modules_to_save.default.bias",
+        "heads.2.1.weight", "heads.2.1.bias"
+    }
+
+    input_ids, attention_mask = padded_batch()
+    loss = classifier(input_ids=input_ids, attention_mask=attention_mask, labels=torch.tensor([0, 1, 2, 0, 1])).loss
+    loss.backward()
+    lora_B = model.get_base_model().bert.encoder.layer[0].attention.self.query.lora_B["default"]
+    assert lora_B.weight.grad is not None and lora_B.weight.grad.abs().sum() > 0
+    save_file(classifier.state_dict(), str(tmp_path / "model.safetensors"))
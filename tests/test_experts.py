@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import copy
+
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from src.experts.engine import ExpertEngine
+
+TARGETS = ("attn.c_attn", "attn.c_proj", "mlp.c_fc", "mlp.c_proj")
+SCALING = 2.0
+
+
+def tiny_model():
+    torch.manual_seed(0)
+    config = GPT2Config(n_layer=2, n_embd=32, n_head=4, vocab_size=100, n_positions=128,
+                        bos_token_id=0, eos_token_id=0)
+    model = GPT2LMHeadModel(config).eval()
+    with torch.no_grad():
+        # Make positions matter, so a misaligned cache changes the greedy tokens
+        model.transformer.wpe.weight.mul_(50)
+    return model
+
+
+def random_adapter(model, rank=4):
+    layers = {}
+    for i in range(model.config.n_layer):
+        for name in TARGETS:
+            target = f"transformer.h.{i}.{name}"
+            in_features, out_features = model.get_submodule(target).weight.shape
+            layers[target] = (torch.randn(rank, in_features) * 0.2, torch.randn(out_features, rank) * 0.2)
+    return layers
+
+
+def merged(model, layers):
+    """Copy of `model` with the LoRA delta folded into its (Conv1D, in x out) weights."""
+    model = copy.deepcopy(model)
+    with torch.no_grad():
+        for target, (lora_A, lora_B) in layers.items():
+            model.get_submodule(target).weight += SCALING * (lora_B @ lora_A).T
+    return model
+
+
+def greedy(model, prompt, max_new_tokens):
+    tokens = list(prompt)
+    with torch.no_grad():
+        for _ in range(max_new_tokens):
+            logits = model(torch.tensor([tokens]), use_cache=False).logits
+            tokens.append(int(logits[0, -1].argmax()))
+    return tokens[len(prompt):]
+
+
+def test_mixed_batch_matches_merged_adapters():
+    model = tiny_model()
+    adapters = {name: random_adapter(model) for name in ("a", "b")}
+    reference = {name: merged(model, layers) for name, layers in adapters.items()}
+    reference[None] = copy.deepcopy(model)
+
+    engine = ExpertEngine(model, max_batch_size=3, eos_token_id=-1)
+    for name, layers in adapters.items():
+        engine.add_adapter(name, layers, scaling=SCALING)
+
+    # Different prompt and output lengths, more requests than rows: rows are
+    # evicted and refilled mid-stream while the cache stays left-padded
+    torch.manual_seed(1)
+    prompts = [torch.randint(1, 100, (length,)).tolist() for length in (5, 9, 3, 7, 4, 6)]
+    experts = ["a", "b", None, "b", "a", None]
+    max_new_tokens = [6, 3, 8, 5, 2, 1]
+    requests = [
+        engine.submit(prompt, expert=expert, max_new_tokens=n)
+        for prompt, expert, n in zip(prompts, experts, max_new_tokens)
+    ]
+    engine.run()
+
+    for request, prompt, expert, n in zip(requests, prompts, experts, max_new_tokens):
+        assert request.finished
+        assert request.output_ids == greedy(reference[expert], prompt, n)
+    assert engine.active == [] and engine._cache is None
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from src.router.knn import KNNRouterModel, VectorIndex
+
+
+def clustered(rng, n, centers):
+    vectors = centers[rng.integers(0, len(centers), size=n)]
+    return vectors + 0.02 * rng.standard_normal(vectors.shape).astype(np.float32)
+
+
+@pytest.mark.parametrize("dtype", VectorIndex.DTYPES)
+def test_ivf_matches_exact_search(tmp_path, dtype):
+    rng = np.random.default_rng(0)
+    centers = VectorIndex._normalize(rng.standard_normal((64, 32)))
+    index = VectorIndex(str(tmp_path), dim=32, dtype=dtype)
+    index.add(clustered(rng, 4000, centers), rng.integers(0, 4, size=4000))
+    index.train_ivf(16)
+    # Appended after training, so these rows live outside the sorted blocks
+    index.add(clustered(rng, 500, centers), rng.integers(0, 4, size=500))
+
+    queries = clustered(rng, 20, centers)
+    exact_scores, exact_idx = index.search(queries, top_k=5, num_probe=0)
+    ivf_scores, ivf_idx = index.search(queries, top_k=5, num_probe=16)
+    np.testing.assert_array_equal(ivf_idx, exact_idx)
+    np.testing.assert_allclose(ivf_scores, exact_scores, rtol=1e-5)
+
+    scores, idx = index.search(queries, top_k=5, num_probe=2)
+    assert (np.diff(scores, axis=1) <= 0).all()
+    assert (idx >= 0).all()
+
+
+def test_vote_rejects_empty_index(tmp_path):
+    model = KNNRouterModel(encoder=None, index=VectorIndex(str(tmp_path), dim=8))
+    with pytest.raises(ValueError):
+        model.vote(np.ones((1, 8), dtype=np.float32))
+
+
+def test_appended_label_is_routed(tmp_path):
+    rng = np.random.default_rng(0)
+    centers = VectorIndex._normalize(rng.standard_normal((5, 16)))
+    index = VectorIndex(str(tmp_path), dim=16)
+    labels = rng.integers(0, 4, size=200)
+    index.add(centers[labels] + 0.02 * rng.standard_normal((200, 16)), labels)
+    model = KNNRouterModel(encoder=None, index=index, num_labels=4, top_k=5)
+
+    # A new expert registered after the model config was written
+    index.add(centers[[4] * 20] + 0.02 * rng.standard_normal((20, 16)), [4] * 20)
+    reopened = VectorIndex(str(tmp_path))
+    assert reopened.num_labels == 5
+
+    logits = model.vote(centers[[4, 1]].astype(np.float32))
+    assert logits.shape == (2, 5)
+    assert logits.argmax(axis=1).tolist() == [4, 1]
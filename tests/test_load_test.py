@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+import pandas as pd
+import pytest
+import torch
+from transformers import GPT2Config, GPT2LMHeadModel
+
+from src.data.partitioned import PartitionedParquetStore
+from src.experts.engine import ExpertEngine
+from src.pipeline.load_test import LoadGenerator, RoutedExpertTarget, load_queries
+
+
+class FixedRouter:
+    def predict(self, name, query):
+        return 0
+
+
+def target(timeout=5.0, max_new_tokens=4, n_positions=16):
+    torch.manual_seed(0)
+    config = GPT2Config(n_layer=1, n_embd=16, n_head=2, vocab_size=50, n_positions=n_positions,
+                        bos_token_id=0, eos_token_id=0)
+    engine = ExpertEngine(GPT2LMHeadModel(config), eos_token_id=-1)
+    return RoutedExpertTarget(FixedRouter(), "router", engine, {}, max_new_tokens=max_new_tokens, timeout=timeout)
+
+
+def test_too_long_prompt_fails_alone():
+    routed = target()
+    # Longer than n_positions: rejected on submit, before it reaches the engine
+    with pytest.raises(ValueError):
+        routed(list(range(1, 40)))
+    assert len(routed([1, 2, 3])) == 4
+
+    generator = LoadGenerator(routed, [list(range(1, 40)), [1, 2, 3]], timeout=5.0)
+    summary = generator.run(rate=50, concurrency=2, num_requests=6, arrival="constant")
+    assert summary["completed"] == 3 and summary["error_rate"] == 0.5
+
+
+def test_failed_step_raises_instead_of_hanging(monkeypatch):
+    routed = target()
+    step = routed.engine.step
+
+    def failing_step():
+        monkeypatch.setattr(routed.engine, "step", step)
+        raise RuntimeError("step failed")
+
+    monkeypatch.setattr(routed.engine, "step", failing_step)
+    with pytest.raises(RuntimeError):
+        routed([1, 2, 3])
+    assert len(routed([1, 2, 3])) == 4
+
+
+def test_timeout_does_not_wait_for_a_running_step(monkeypatch):
+    routed = target(timeout=0.2)
+    step = routed.engine.step
+
+    def slow_step():
+        time.sleep(1.0)
+        return step()
+
+    monkeypatch.setattr(routed.engine, "step", slow_step)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        routed([1, 2, 3])
+    assert time.perf_counter() - start < 0.6
+
+
+def test_pending_request_times_out_and_is_cancelled():
+    routed = target(timeout=0.2, max_new_tokens=4000, n_positions=4096)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        routed([1, 2, 3])
+    assert time.perf_counter() - start < 2.0
+
+    deadline = time.perf_counter() + 2.0
+    while routed.engine.active and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    assert routed.engine.active == [] and not routed.engine.waiting
+
+
+def test_split_queries_are_shuffled_before_limit(tmp_path):
+    df = pd.DataFrame({"chunk": [f"text {i}" for i in range(40)], "label": [i // 10 for i in range(40)]})
+    path = PartitionedParquetStore(str(tmp_path / "test_dataset.parquet")).write(df)
+    queries = load_queries(path, limit=12, seed=0)
+    assert len(queries) == 12
+    assert len({int(query.split()[1]) // 10 for query in queries}) > 1
+    assert queries == load_queries(path, limit=12, seed=0)
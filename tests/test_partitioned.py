@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from src.data.partitioned import PartitionedParquetStore
+
+
+def test_partitioned_split_reads_back(tmp_path):
+    df = pd.DataFrame({"chunk": [f"text {i}" for i in range(30)], "label": [i % 3 for i in range(30)]})
+    store = PartitionedParquetStore(str(tmp_path / "train_dataset.parquet"))
+    store.write(df, row_group_size=4)
+
+    read = store.to_pandas(columns=["chunk", "label"])
+    assert sorted(zip(read["chunk"], read["label"])) == sorted(zip(df["chunk"], df["label"]))
+    assert read["label"].dtype == df["label"].dtype
+    assert store.get_label_counts() == {0: 10, 1: 10, 2: 10}
+
+
+def written_store(tmp_path, counts=(30, 20, 10), row_group_size=4):
+    labels = [label for label, count in enumerate(counts) for _ in range(count)]
+    df = pd.DataFrame({"chunk": [f"text {i}" for i in range(len(labels))], "label": labels})
+    store = PartitionedParquetStore(str(tmp_path / "train_dataset.parquet"))
+    store.write(df, row_group_size=row_group_size)
+    return store, df
+
+
+def check_rows(sample, df):
+    chunks = sample["chunk"]
+    assert len(set(chunks)) == len(chunks)
+    expected = dict(zip(df["chunk"], df["label"]))
+    assert all(expected[chunk] == label for chunk, label in zip(chunks, sample["label"]))
+
+
+def test_balanced_sample(tmp_path):
+    store, df = written_store(tmp_path)
+    sample = store.sample(seed=0)
+    assert Counter(sample["label"]) == {0: 10, 1: 10, 2: 10}
+    check_rows(sample, df)
+    # Labels with fewer rows than requested give all they have
+    assert Counter(store.sample(n_per_label=15, seed=0)["label"]) == {0: 15, 1: 15, 2: 10}
+
+
+def test_stratified_sample_hands_leftovers_to_largest_remainders(tmp_path):
+    store, df = written_store(tmp_path)
+    # Shares of 7 rows are 3.5 / 2.33 / 1.17: the leftover row goes to label 0
+    sample = store.sample(total=7, strategy="stratified", columns=["chunk"], seed=0)
+    assert Counter(sample["label"]) == {0: 4, 1: 2, 2: 1}
+    check_rows(sample, df)
+    with pytest.raises(ValueError):
+        store.sample(strategy="stratified")
+
+
+def test_sample_reads_only_needed_row_groups(tmp_path, monkeypatch):
+    store, df = written_store(tmp_path)
+    read_row_group = pq.ParquetFile.read_row_group
+    reads = []
+
+    def counting_read(self, i, *args, **kwargs):
+        reads.append(i)
+        return read_row_group(self, i, *args, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, "read_row_group", counting_read)
+    sample = store.sample(n_per_label=3, seed=0)
+    # Three labels, and one 4-row group holds the 3 rows each needs
+    assert len(reads) == 3
+    assert Counter(sample["label"]) == {0: 3, 1: 3, 2: 3}
+    check_rows(sample, df)
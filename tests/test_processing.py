@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+import json
+import sqlite3
+
+import pytest
+
+from src.data.processing import SQLiteDatasetLoader
+
+ROWS = [
+    ("t1", "alpha beta gamma delta", "sport", "['alpha beta gamma', 'x']", None),
+    ("t2", "short", "news", "['one two three']", json.dumps([{"question": "q", "answer": "a"}])),
+    ("t3", "one two three four five", "sport", "['four five six']", None),
+    ("t4", "six seven eight nine", "tech", "['seven eight nine']", None),
+    ("t5", "ten eleven", "news", "['ten eleven twelve']", None),
+]
+
+
+@pytest.fixture
+def loader(tmp_path):
+    conn = sqlite3.connect(tmp_path / "articles.db")
+    conn.execute("CREATE TABLE articles (title TEXT, full_text TEXT, category TEXT, content_blocks TEXT, sections TEXT)")
+    conn.executemany("INSERT INTO articles VALUES (?, ?, ?, ?, ?)", ROWS)
+    conn.commit()
+    conn.close()
+    config = {
+        "Path": "articles.db", "TableName": "articles", "TextColumn": "full_text",
+        "LabelColumn": "category", "TitleColumn": "title", "ChunkColumn": "content_blocks",
+        "BatchSize": 2, "MinChunkWords": 3, "AllowedCategories": [], "MinTextLength": 12
+    }
+    loader = SQLiteDatasetLoader(str(tmp_path), config)
+    yield loader
+    loader.close()
+
+
+def titles(batches):
+    return [title for df in batches for title in df["title"]]
+
+
+def test_only_mode_columns_are_selected(loader):
+    for use_chunks, content in ((False, "full_text"), (True, "content_blocks")):
+        columns = loader._mode_columns(use_chunks)
+        for df in loader.iter_rows(columns=columns, min_text_length=0):
+            assert list(df.columns) == ["category", "title", content]
+
+
+def test_category_join_and_min_length_pushdown(loader):
+    assert titles(loader.iter_rows(allowed_categories=["sport", "tech"], min_text_length=0)) == ["t1", "t3", "t4"]
+    # MinTextLength from the config drops "short" and "ten eleven"
+    assert titles(loader.iter_rows()) == ["t1", "t3", "t4"]
+    assert titles(loader.iter_rows(allowed_categories=["news"])) == []
+
+
+def test_interleaved_generators_keep_their_own_filter(loader):
+    sport = loader.iter_rows(allowed_categories=["sport"], min_text_length=0)
+    news = loader.iter_rows(allowed_categories=["news"], min_text_length=0)
+    first = next(sport)
+    assert titles(news) == ["t2", "t5"]
+    assert titles([first, *sport]) == ["t1", "t3"]
+    temp_tables = loader.conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'table'").fetchall()
+    assert temp_tables == []
+
+
+def test_export_ignores_min_text_length(loader, tmp_path):
+    output = tmp_path / "export.jsonl"
+    loader.export_jsonl(str(output))
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [r["input"] for r in records] == ["t1", "t2\n\nq", "t3", "t4", "t5"]
+    assert loader.rows_read == len(ROWS)
+
+
+def test_rows_read_counts_each_load(loader):
+    dataset = loader.load_all_encoded_dataset()
+    assert loader.rows_read == 3
+    assert set(dataset["title"]) == {"t1", "t3", "t4"}
+    loader.load_all_encoded_dataset()
+    assert loader.rows_read == 3